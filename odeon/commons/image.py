@@ -4,15 +4,26 @@ from math import isclose
 from rasterio.enums import Resampling
 import rasterio.transform
 import rasterio.windows
-from rasterio.plot import reshape_as_image, reshape_as_raster
-from skimage import img_as_float
-from odeon.commons.rasterio import get_bounds, create_patch_from_center
+from rasterio.plot import reshape_as_raster
+from odeon.commons.rasterio import get_bounds, create_patch_from_center, window_from_bounds
 from odeon import LOGGER
 
+# GDAL configuration used when a raster file is opened to read a single patch:
+# the parent folder (which can hold thousands of patches) is not listed looking
+# for sidecar files.
+PATCH_READ_ENV = {"GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+                  "GDAL_CACHEMAX": 512}
+
+# GDAL configuration used while large rasters are kept open to read many windows,
+# the reads of remote rasters (Cloud Optimized GeoTiff over http or s3) are cached.
+WINDOW_READ_ENV = {**PATCH_READ_ENV,
+                   "VSI_CACHE": True,
+                   "VSI_CACHE_SIZE": 536870912}
+
 
 def raster_to_ndarray_from_dataset(
         src, width, height, resolution=None, band_indices=None, resampling=Resampling.bilinear,
-        window=None, boundless=True):
+        window=None, boundless=True, out=None, with_meta=True):
 
     """Load and transform an image into a ndarray according to parameters:
     - center-cropping to fit width, height
@@ -36,6 +47,18 @@ def raster_to_ndarray_from_dataset(
     window: rasterio.window, see rasterio docs
         use a window in rasterio format or not to select a subsection of the raster
         Default: None
+    boundless: bool
+        read outside of the raster extent or not, see rasterio docs
+        Default: True
+    out: numpy NDArray, optional
+        buffer of shape (bands, height, width) and of the raster dtype where the pixels
+        are read, the returned image is then a view on it. It can be the transposed view
+        of a (height, width, bands) array to get a contiguous image.
+        Default: None (a new contiguous (height, width, bands) array is allocated)
+    with_meta: bool
+        compute the metadata of the output image or not, None is returned in place
+        of the metadata when it is not computed.
+        Default: True
     Returns
     -------
     out: Tuple[ndarray, dict]
@@ -62,9 +85,10 @@ def raster_to_ndarray_from_dataset(
                 return dim_min, dim_max
             dim_center = (dim_max + dim_min) / 2.0
             if dim_dist < dim_max-dim_min:
-                # crop image from center
-                out_max = dim_center + dim_dist
-                out_min = dim_center - dim_dist
+                # crop image from center, the window spans exactly dim_size pixels
+                # at the output resolution so GDAL does not have to resample it
+                out_max = dim_center + dim_dist / 2.0
+                out_min = dim_center - dim_dist / 2.0
             else:
                 # not enought data raise error
                 msg = f"could get not get out res = {dim_res} and out size = {dim_size}"
@@ -74,20 +98,23 @@ def raster_to_ndarray_from_dataset(
 
         left, right = get_dim_bounds(width, resolution[0], left, right)
         bottom, top = get_dim_bounds(height, resolution[1], bottom, top)
-        window = rasterio.windows.from_bounds(left, bottom, right, top, src.meta["transform"])
+        window = window_from_bounds(left, bottom, right, top, src.transform)
 
-    else:
-        left, bottom, right, top = rasterio.windows.bounds(window, src.meta["transform"])
+    elif with_meta:
+        left, bottom, right, top = rasterio.windows.bounds(window, src.transform)
+
+    if out is None:
+        # GDAL writes the pixels interleaved through the band view of an image buffer
+        out = np.empty((height, width, len(band_indices)), dtype=src.dtypes[0]).transpose((2, 0, 1))
 
     img = src.read(
-        indexes=band_indices, window=window, out_shape=(len(band_indices), height, width),
-        resampling=resampling, boundless=boundless)
+        indexes=band_indices, window=window, out=out, resampling=resampling, boundless=boundless)
 
-    " reshape img from gdal band format to numpy ndarray format "
-    img = reshape_as_image(img)
+    " reshape img from gdal band format to numpy ndarray format (view, no copy) "
+    img = np.transpose(img, (1, 2, 0))
 
-    if img.ndim == 2:
-        img = img[..., np.newaxis]
+    if not with_meta:
+        return img, None
 
     meta = src.meta.copy()
     LOGGER.debug(meta)
@@ -133,7 +160,7 @@ def raster_to_ndarray(image_file,
     """
     LOGGER.debug(image_file)
 
-    with rasterio.open(image_file) as src:
+    with rasterio.Env(**PATCH_READ_ENV), rasterio.open(image_file) as src:
 
         if resolution is None:
             resolution = src.res
@@ -145,6 +172,88 @@ def raster_to_ndarray(image_file,
         return raster_to_ndarray_from_dataset(src, width, height, resolution, band_indices, resampling, window)
 
 
+def normalize_to_float32(img, out=None):
+    """Normalize an image to [0, 1] in float32 in a single pass over the pixels.
+    Integer pixels are divided by the max value of their type (255 for uint8,
+    65535 for uint16), float pixels are only cast.
+
+    Parameters
+    ----------
+    img : numpy NDArray
+        the image to normalize, it can be a strided view like the one returned
+        by raster_to_ndarray_from_dataset
+    out : numpy NDArray, optional
+        float32 array with the shape of img where the result is written,
+        by default None (a new array is allocated)
+
+    Returns
+    -------
+    numpy NDArray
+        the normalized image in float32
+    """
+    if np.issubdtype(img.dtype, np.integer):
+        return np.divide(img, np.iinfo(img.dtype).max, out=out, dtype=np.float32)
+
+    if out is None:
+        return img.astype(np.float32, copy=False)
+
+    np.copyto(out, img, casting="unsafe")
+    return out
+
+
+def make_center_cropper(src_shape, cropx, cropy):
+    """Make a function cropping numpy arrays of a given shape based on the center
+    of array (rounded to inf element for array of even size). The crop slices are
+    computed once, so it can be applied to each array of a batch.
+    We expect array to be of format H*W*C
+
+    Parameters
+    ----------
+    src_shape : tuple of int
+        shape of the arrays to crop, of dimension 2 or 3
+    cropx : int
+        size of crop on x axis (second axis)
+    cropy : int
+        size of crop on y axis (first axis)
+
+    Returns
+    -------
+    callable
+        a function taking a numpy NDArray and returning a cropped view of it
+    """
+
+    y, x = src_shape[0], src_shape[1]
+    startx = x // 2 - (cropx // 2)
+    starty = y // 2 - (cropy // 2)
+    slc = (slice(starty, starty + cropy), slice(startx, startx + cropx))
+    return lambda img: img[slc]
+
+
+def make_margin_cropper(src_shape, margin_x, margin_y):
+    """Make a function substracting a margin to numpy arrays of a given shape.
+    The crop slices are computed once, so it can be applied to each array of a batch.
+    We expect array to be of format H*W*C
+
+    Parameters
+    ----------
+    src_shape : tuple of int
+        shape of the arrays to crop, of dimension 2 or 3
+    margin_x : int
+        size of the margin on x axis (second axis)
+    margin_y : int
+        size of the margin on y axis (first axis)
+
+    Returns
+    -------
+    callable
+        a function taking a numpy NDArray and returning a view of it without its margin
+    """
+
+    y, x = src_shape[0], src_shape[1]
+    slc = (slice(margin_y, y - margin_y), slice(margin_x, x - margin_x))
+    return lambda img: img[slc]
+
+
 def crop_center(img, cropx, cropy):
     """Crop numpy array based on the center of
     array (rounded to inf element for array of even size)
@@ -164,17 +273,7 @@ def crop_center(img, cropx, cropy):
         the cropped numpy 3d array
     """
 
-    if img.ndim == 2:
-
-        y, x = img.shape
-
-    else:
-
-        y, x, _ = img.shape
-
-    startx = x // 2 - (cropx // 2)
-    starty = y // 2 - (cropy // 2)
-    return img[starty:starty + cropy, startx:startx + cropx]
+    return make_center_cropper(img.shape, cropx, cropy)(img)
 
 
 def substract_margin(img, margin_x, margin_y):
@@ -195,15 +294,8 @@ def substract_margin(img, margin_x, margin_y):
     numpy NDArray
         the substracted of its margin numpy 3darray
     """
-    if img.ndim == 2:
-
-        y, x = img.shape
-
-    else:
-
-        y, x, _ = img.shape
 
-    return img[0 + margin_y: y - margin_y, 0 + margin_x:x - margin_x]
+    return make_margin_cropper(img.shape, margin_x, margin_y)(img)
 
 
 class TypeConverter:
@@ -239,7 +331,8 @@ class TypeConverter:
         ----------
         img_type : str
             we actually handle float32, int8, and thresholded
-            1bit.
+            1bit stored in uint8 ("bit", packed on disk with the nbits
+            creation option).
         Returns
         -------
         TypeConverter
@@ -273,18 +366,20 @@ class TypeConverter:
 
             elif self._to == "uint8":
 
-                if img.max() > 1:
+                scale = 255.0
+                if np.issubdtype(img.dtype, np.integer):
+                    # integer data are first normalized to 0 - 1 with the max of their type
+                    scale /= np.iinfo(img.dtype).max
 
-                    info = np.idebug(img.dtype)  # Get the information of the incoming image type
-                    img = img.astype(np.float32) / info.max  # normalize the data to 0 - 1
-
-                img = 255 * img  # scale by 255
-                return img.astype(np.uint8)
+                # scale, clip and cast are done on a single float32 buffer
+                scratch = np.multiply(img, scale, dtype=np.float32)
+                np.clip(scratch, 0, 255, out=scratch)
+                return scratch.astype(np.uint8)
 
             elif self._to == "bit":
 
-                img = img > threshold
-                return img.astype(np.uint8)
+                # a boolean array can be viewed as uint8 without copy
+                return np.greater(img, threshold).view(np.uint8)
 
             else:
 
@@ -292,6 +387,109 @@ class TypeConverter:
                 return img
 
 
+def _get_read_buffer(buffers, key, src, band_indices, height, width):
+    """Get a buffer to read a window of a layer from a cache of read buffers
+    owned by the caller. The buffer of a layer is reused as long as the requested
+    shape does not change, so the raster dtype is only queried when the buffer
+    is created: the cache must be emptied when the rasters of the layers change.
+    The buffer is a (bands, height, width) view of a contiguous (height, width, bands)
+    array, matching the layout of the stacked output.
+
+    Parameters
+    ----------
+    buffers : dict
+        read buffers by layer name
+    key : str
+        name of the layer
+    src : rasterio.DatasetReader
+        connection to the raster of the layer
+    band_indices : obj:`list` of :obj: `int`
+        list of band indices to read
+    height : int
+        the height of the window
+    width : int
+        the width of the window
+
+    Returns
+    -------
+    numpy NDArray
+        a buffer of shape (bands, height, width) and of the raster dtype
+    """
+    shape = (len(band_indices), height, width)
+    buffer = buffers.get(key)
+
+    if buffer is None or buffer.shape != shape:
+        buffer = np.empty((height, width, len(band_indices)), dtype=src.dtypes[0]).transpose((2, 0, 1))
+        buffers[key] = buffer
+
+    return buffer
+
+
+def _read_window(raster, bounds, width, height, resolution, resampling, out=None):
+    """Read the window of bounds of a raster from a dictionary of raster.
+
+    Parameters
+    ----------
+    raster : dict
+        raster definition with at least its "connection" and its "bands"
+    bounds : Union[Tuple, List]
+        bounds delimiting the window
+    width : int
+        the width of the output
+    height : int
+        the height of the output
+    resolution: obj:`list` of :obj: `float`
+        the output resolution for x and y
+    resampling: one enum from rasterio.Reampling
+        resampling method to use when a resolution change is necessary.
+    out: numpy NDArray, optional
+        read buffer of shape (bands, height, width), see _get_read_buffer,
+        by default None (a new array is allocated)
+
+    Returns
+    -------
+    numpy NDArray
+        the window in (height, width, bands) shape
+    """
+    src = raster["connection"]
+    window = window_from_bounds(bounds[0], bounds[1], bounds[2], bounds[3], src.transform)
+    img, _ = raster_to_ndarray_from_dataset(src,
+                                            width,
+                                            height,
+                                            resolution,
+                                            band_indices=raster["bands"],
+                                            resampling=resampling,
+                                            window=window,
+                                            out=out,
+                                            with_meta=False)
+    return img
+
+
+def _rescale_to(img, out):
+    """Write an image in an output array, rescaling its pixels from the range
+    of its type to the range of the output type. The range of a float type
+    is [0, 1], the range of an integer type is [0, max of the type].
+
+    Parameters
+    ----------
+    img : numpy NDArray
+        the image to rescale
+    out : numpy NDArray
+        array with the shape of img where the result is written
+    """
+    if np.issubdtype(out.dtype, np.floating):
+        normalize_to_float32(img, out=out)
+        return
+
+    in_max = np.iinfo(img.dtype).max if np.issubdtype(img.dtype, np.integer) else 1
+    out_max = np.iinfo(out.dtype).max
+
+    if in_max == out_max:
+        np.copyto(out, img, casting="unsafe")
+    else:
+        np.multiply(img, out_max / in_max, out=out, casting="unsafe")
+
+
 def ndarray_to_affine(affine):
     """
 
@@ -321,7 +519,10 @@ class CollectionDatasetReader:
                                       height,
                                       resolution,
                                       dem=False,
-                                      resampling=Resampling.bilinear):
+                                      resampling=Resampling.bilinear,
+                                      dtype=np.float32,
+                                      executor=None,
+                                      buffers=None):
         """Stack multiple raster band in one raster, with a specific output format and resolution
         and output bounds. It can handle the DEM = DSM - DTM computation if the dict of raster
         band includes a band called "DTM" and a band called "DSM", but you must set the dem parameter
@@ -349,6 +550,18 @@ class CollectionDatasetReader:
         resampling: one enum from rasterio.Reampling
             resampling method to use when a resolution change is necessary.
             Default: Resampling.bilinear
+        dtype: Union[str, numpy.dtype]
+            type of the output. With a float type pixels are normalized to [0, 1],
+            with an integer type pixels are rescaled to the range of the type without
+            any float conversion when the rasters already have this type.
+            Default: numpy.float32
+        executor: concurrent.futures.Executor, optional
+            executor used to read the windows of the rasters concurrently, typically a
+            ThreadPoolExecutor. The windows are read sequentially when None, by default None
+        buffers: dict, optional
+            cache of read buffers by layer name owned by the caller, reused from one window
+            to the next. It must be emptied when the rasters of the layers change.
+            A new buffer is allocated for each read when None, by default None
 
         Returns
         -------
@@ -356,65 +569,61 @@ class CollectionDatasetReader:
             the stacked raster
         """
         handle_dem = False
-        stacked_bands = None
 
         if "DSM" in dict_of_raster.keys() and "DTM" in dict_of_raster.keys() and dem is True:
             handle_dem = True
 
-        for key, value in dict_of_raster.items():
-            if (key not in ["DSM", "DTM"]) or handle_dem is False:
-                src = value["connection"]
-                window = rasterio.windows.from_bounds(
-                    bounds[0], bounds[1], bounds[2], bounds[3], src.meta["transform"])
-                band_indices = value["bands"]
-                img, _ = raster_to_ndarray_from_dataset(src,
-                                                        width,
-                                                        height,
-                                                        resolution,
-                                                        band_indices=band_indices,
-                                                        resampling=resampling,
-                                                        window=window)
-
-                # pixels are normalized to [0, 1]
-                img = img_as_float(img)
-
+        # the rasters are independent, with an executor their windows are read concurrently,
+        # rasterio releases the GIL while GDAL reads and decodes the blocks.
+        keys = [key for key in dict_of_raster.keys() if (key not in ["DSM", "DTM"]) or handle_dem is False]
+        if handle_dem:
+            keys += ["DSM", "DTM"]
+
+        # the buffers are taken before the reads, each layer is then read by a single task
+        # which is the only one to write in the buffer of the layer.
+        outs = {key: None if buffers is None else
+                _get_read_buffer(buffers, key, dict_of_raster[key]["connection"], dict_of_raster[key]["bands"],
+                                 height, width)
+                for key in keys}
+
+        if executor is None:
+            images = {key: _read_window(dict_of_raster[key], bounds, width, height, resolution, resampling,
+                                        outs[key])
+                      for key in keys}
+        else:
+            futures = {key: executor.submit(_read_window, dict_of_raster[key], bounds, width,
+                                            height, resolution, resampling, outs[key])
+                       for key in keys}
+            images = {key: future.result() for key, future in futures.items()}
+
+        # the output is allocated once and each raster is written in its own channel slice
+        # with the dem computation, DSM and DTM give a single band
+        nb_of_bands = sum(len(dict_of_raster[key]["bands"]) for key in keys if key != "DTM" or not handle_dem)
+        stacked_bands = np.empty((height, width, nb_of_bands), dtype=dtype)
+        offset = 0
+
+        for key in keys:
+            if key not in ["DSM", "DTM"] or handle_dem is False:
+                img = images[key]
                 LOGGER.debug(f"type of img: {type(img)}, shape {img.shape}")
 
-                stacked_bands = img if stacked_bands is None else np.dstack([stacked_bands, img])
-                LOGGER.debug(f"type of stacked bands: {type(stacked_bands)}, shape {stacked_bands.shape}")
+                # pixels are normalized to the output range directly in the output buffer
+                _rescale_to(img, stacked_bands[:, :, offset:offset + img.shape[-1]])
+                offset += img.shape[-1]
 
         if handle_dem:
-            dsm_ds = dict_of_raster["DSM"]["connection"]
-            dtm_ds = dict_of_raster["DTM"]["connection"]
-            dsm_window = rasterio.windows.from_bounds(
-                bounds[0], bounds[1], bounds[2], bounds[3], dsm_ds.meta["transform"])
-            dtm_window = rasterio.windows.from_bounds(
-                bounds[0], bounds[1], bounds[2], bounds[3], dtm_ds.meta["transform"])
-            band_indices = dict_of_raster["DSM"]["bands"]
-
-            dsm_img, _ = raster_to_ndarray_from_dataset(dsm_ds,
-                                                        width,
-                                                        height,
-                                                        resolution,
-                                                        band_indices=band_indices,
-                                                        resampling=resampling,
-                                                        window=dsm_window)
-
-            dtm_img, _ = raster_to_ndarray_from_dataset(dtm_ds,
-                                                        width,
-                                                        height,
-                                                        resolution,
-                                                        band_indices=band_indices,
-                                                        resampling=resampling,
-                                                        window=dtm_window)
-
-            # raw dem = dsm - dtm
-            img = dsm_img - dtm_img
+            dsm_img = images["DSM"]
+            dtm_img = images["DTM"]
+
+            # raw dem = dsm - dtm, computed in float32 as the elevations are not normalized,
+            # directly in the output buffer when it is a float32 one.
+            out = stacked_bands[:, :, offset:offset + dsm_img.shape[-1]]
+            img = out if out.dtype == np.float32 else np.empty(out.shape, dtype=np.float32)
+            np.subtract(dsm_img, dtm_img, out=img, dtype=np.float32)
             # LOGGER.debug(img.sum())
             # dsm should not be under dtm theorically but this could happen
-            # due to product specification (rounding) etc.. so add check
-            mne_msk = dtm_img > dsm_img
-            img[mne_msk] = 0
+            # due to product specification (rounding) etc.. those negative values
+            # are set to 0 by the low pass filter below.
             # scaling to vertical resolution such that it should be ok when convert
             # to uint8
             img *= 5  # empircally chosen factor
@@ -425,18 +634,19 @@ class CollectionDatasetReader:
             # img[img < xmin] = xmin  # low pass filter
             # img[img > xmax] = xmax  # high pass filter
 
-            # low pass filer, should not do anatyhing as we should
-            # already have only positives values.
-            img[img < 0] = 0
-            # high pass filter.
-            img[img > 255] = 255
+            # low pass and high pass filters.
+            np.clip(img, 0, 255, out=img)
 
-            # normalize to [0, 1]. as input are float img_as_float could not be used for
-            # normalization.
-            img = img / 255
+            # normalize to [0, 1] in place, or rescale to the range of the output type.
+            img /= 255
             # LOGGER.debug(f"img min: {img.min()}, img max: {img.max()}, img shape: {img.shape}")
-            stacked_bands = img if stacked_bands is None else np.dstack([stacked_bands, img])
-            LOGGER.debug(f"type of stacked bands: {type(stacked_bands)}, shape {stacked_bands.shape}")
+            if img is not out:
+                _rescale_to(img, out)
+            offset += out.shape[-1]
+
+        assert offset == nb_of_bands
+
+        LOGGER.debug(f"type of stacked bands: {type(stacked_bands)}, shape {stacked_bands.shape}")
 
         return stacked_bands
 
@@ -448,7 +658,9 @@ class CollectionDatasetReader:
                             compute_only_masks=False,
                             raster_out=None,
                             meta_msk=None,
-                            output_type="uint8"):
+                            output_type="uint8",
+                            executor=None,
+                            buffers=None):
         """stack band at window level of geotif layer and create a
         couple patch image and patch mask
 
@@ -470,6 +682,10 @@ class CollectionDatasetReader:
             metadata in rasterio format for raster mask
         output_type: str
             output type of output patch raster in numpy dtype format
+        executor: concurrent.futures.Executor, optional
+            executor used to read the windows of the layers concurrently
+        buffers: dict, optional
+            cache of read buffers by layer name, see get_stacked_window_collection
 
         Returns
         -------
@@ -484,8 +700,7 @@ class CollectionDatasetReader:
                             meta['resolution'][0],
                             meta['resolution'][1])
 
-        window = rasterio.windows.from_bounds(
-            bounds[0], bounds[1], bounds[2], bounds[3], meta['transform'])
+        window = window_from_bounds(bounds[0], bounds[1], bounds[2], bounds[3], meta['transform'])
 
         # Adapt meta for the patch
         meta_img_patch = meta.copy()
@@ -508,8 +723,11 @@ class CollectionDatasetReader:
                                                                         meta_img_patch['height'],
                                                                         meta_img_patch['resolution'],
                                                                         dem,
-                                                                        resampling=resampling)
-            raster_img = (reshape_as_raster(img) * 255).astype(output_type)
+                                                                        resampling=resampling,
+                                                                        dtype=output_type,
+                                                                        executor=executor,
+                                                                        buffers=buffers)
+            raster_img = reshape_as_raster(img)
 
             with rasterio.open(center["img_file"], 'w', **meta_img_patch) as dst:
                 dst.write(raster_img)
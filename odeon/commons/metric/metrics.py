@@ -25,7 +25,11 @@ The metrics computed are in each case :
 """
 
 import os
+import csv
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import numpy as np
 from odeon import LOGGER
 from odeon.commons.reports.report_factory import Report_Factory
@@ -86,6 +90,7 @@ class Metrics(ABC):
                  get_ROC_PR_values=DEFAULTS_VARS['get_ROC_PR_values'],
                  get_calibration_curves=DEFAULTS_VARS['get_calibration_curves'],
                  get_hists_per_metrics=DEFAULTS_VARS['get_hists_per_metrics'],
+                 num_workers=DEFAULTS_VARS['num_workers'],
                  decimals=DEFAULTS_VARS['decimals']):
         """
         Init function.
@@ -144,6 +149,9 @@ class Metrics(ABC):
         get_hists_per_metrics : bool, optional
             Boolean to know if the user wants to generate histogram for each metric.
             Histograms created using the parameter threshold, by default True.
+        num_workers : int, optional
+            Number of threads reading the masks and predictions in advance while the metrics
+            of a sample are computed, by default 1.
         decimals: int, optional
             Number of digits after the decimal point (use for computation and display).
         """
@@ -188,6 +196,7 @@ class Metrics(ABC):
         self.get_ROC_PR_values = get_ROC_PR_values
         self.get_calibration_curves = get_calibration_curves
         self.get_hists_per_metrics = get_hists_per_metrics
+        self.num_workers = num_workers
         self.decimals = 2 + decimals  # Here + 2 because we wants metrics as percent between 0 and 100.
         self.metrics_names = METRICS_NAMES
         self.nbr_metrics_micro = NBR_METRICS_MICR0
@@ -235,6 +244,32 @@ class Metrics(ABC):
         """
         pass
 
+    def iterate_dataset(self):
+        """
+        Iterate over the samples of the dataset. The next samples are read by background threads while
+        the current one is processed (rasterio releases the GIL during the reads), with at most
+        2 * num_workers samples loaded in advance. With 0 workers the samples are read one after the other.
+
+        Yields
+        ------
+        dict
+            Sample of the dataset with a mask, a prediction and the name of the file.
+        """
+        if self.num_workers < 1:
+            for index in range(len(self.dataset)):
+                yield self.dataset[index]
+            return
+
+        indices = iter(range(len(self.dataset)))
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            futures = deque(executor.submit(self.dataset.__getitem__, index)
+                            for index in islice(indices, 2 * self.num_workers))
+            while futures:
+                sample = futures.popleft().result()
+                for index in islice(indices, 1):
+                    futures.append(executor.submit(self.dataset.__getitem__, index))
+                yield sample
+
     def define_bins(self, bins, n_bins):
         """
         Create a bins list to compute probabilities histograms in functions of the
@@ -291,16 +326,13 @@ class Metrics(ABC):
         np.array or Tuple(np.array)
             Transformed prediction data (with mask data if multiclass case).
         """
-        pred = prediction.copy()
         output = None
         if type_classifier == 'multiclass':
             assert mask is not None
-            output = (np.argmax(mask, axis=2), np.argmax(pred, axis=2))
+            output = (np.argmax(mask, axis=2), np.argmax(prediction, axis=2))
         elif type_classifier == 'binary':
             assert threshold is not None
-            pred[pred < threshold] = 0
-            pred[pred >= threshold] = 1
-            output = pred
+            output = (prediction >= threshold).astype(np.uint8)
         else:
             LOGGER.error('ERROR: type_classifier should be Binary or Multiclass')
             raise OdeonError(ErrorCodes.ERR_JSON_SCHEMA_ERROR,
@@ -407,4 +439,8 @@ class Metrics(ABC):
             Export the metrics per patch in a csv file.
         """
         path_csv = os.path.join(self.output_path, 'metrics_per_patch.csv')
-        self.df_dataset.to_csv(path_csv, index=False)
+        # Rows are written as they are iterated, without building the whole csv text in memory.
+        with open(path_csv, 'w', newline='', buffering=1 << 20) as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(self.df_dataset.columns)
+            writer.writerows(self.df_dataset.itertuples(index=False, name=None))
@@ -38,6 +38,7 @@ class MetricsBinary(Metrics):
                  get_ROC_PR_values=DEFAULTS_VARS['get_ROC_PR_values'],
                  get_calibration_curves=DEFAULTS_VARS['get_calibration_curves'],
                  get_hists_per_metrics=DEFAULTS_VARS['get_hists_per_metrics'],
+                 num_workers=DEFAULTS_VARS['num_workers'],
                  decimals=DEFAULTS_VARS['decimals']):
         """
         This method does the same as Metrics init function :func:`~odeon.commons.metrics.Metrics.__init__()`
@@ -62,14 +63,17 @@ class MetricsBinary(Metrics):
                          get_ROC_PR_values=get_ROC_PR_values,
                          get_calibration_curves=get_calibration_curves,
                          get_hists_per_metrics=get_hists_per_metrics,
+                         num_workers=num_workers,
                          decimals=decimals)
 
         self.df_thresholds, self.cms, self.df_report_metrics = self.create_data_for_metrics()
         self.vect_curves = {}
         if self.get_metrics_per_patch or self.get_hists_per_metrics:
             self.hists_metrics = {}
-            self.df_dataset = pd.DataFrame(index=range(len(self.dataset)),
+            # Float columns for the metrics, only the names of the files are objects.
+            self.df_dataset = pd.DataFrame(np.nan, index=range(len(self.dataset)),
                                            columns=(['name_file'] + self.metrics_names[:-1]))
+            self.df_dataset = self.df_dataset.astype({'name_file': object})
         if self.get_calibration_curves:
             self.prob_true, self.prob_pred = None, None
             self.hist_counts = np.zeros(len(self.bins) - 1)
@@ -111,7 +115,8 @@ class MetricsBinary(Metrics):
         bin_true = np.zeros(len(self.bins))
         bin_total = np.zeros(len(self.bins))
 
-        for dataset_index, sample in enumerate(tqdm(self.dataset, desc='Metrics processing time', leave=True)):
+        for dataset_index, sample in enumerate(tqdm(self.iterate_dataset(), total=len(self.dataset),
+                                                    desc='Metrics processing time', leave=True)):
             mask, pred, name_file = sample['mask'], sample['pred'], sample['name_file']
 
             if not self.in_prob_range:
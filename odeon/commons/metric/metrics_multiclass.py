@@ -35,7 +35,8 @@ class MetricsMulticlass(Metrics):
                  get_ROC_PR_curves=DEFAULTS_VARS['get_ROC_PR_curves'],
                  get_ROC_PR_values=DEFAULTS_VARS['get_ROC_PR_values'],
                  get_calibration_curves=DEFAULTS_VARS['get_calibration_curves'],
-                 get_hists_per_metrics=DEFAULTS_VARS['get_hists_per_metrics']):
+                 get_hists_per_metrics=DEFAULTS_VARS['get_hists_per_metrics'],
+                 num_workers=DEFAULTS_VARS['num_workers']):
         """
         This method does the same as Metrics init function :func:`~odeon.commons.metrics.Metrics.__init__()`
         """
@@ -58,7 +59,8 @@ class MetricsMulticlass(Metrics):
                          get_ROC_PR_curves=get_ROC_PR_curves,
                          get_ROC_PR_values=get_ROC_PR_values,
                          get_calibration_curves=get_calibration_curves,
-                         get_hists_per_metrics=get_hists_per_metrics)
+                         get_hists_per_metrics=get_hists_per_metrics,
+                         num_workers=num_workers)
 
         self.cm_macro, self.cms_classes, self.cm_micro = None, None, None
         self.metrics_by_class, self.metrics_micro, self.cms_one_class = None, None, None
@@ -81,7 +83,9 @@ class MetricsMulticlass(Metrics):
                         ['mean_' + name_column for name_column in self.metrics_names[:-1]] + \
                         ['_'.join(class_i.split(' ')) + '_' + name_column for class_i in self.class_labels
                          for name_column in self.metrics_names[:-1]]
-            self.df_dataset = pd.DataFrame(index=range(len(self.dataset)), columns=self.header)
+            # Float columns for the metrics, only the names of the files are objects.
+            self.df_dataset = pd.DataFrame(np.nan, index=range(len(self.dataset)),
+                                           columns=self.header).astype({'name_file': object})
 
         if self.get_hists_per_metrics:
             self.hists_metrics = {}
@@ -143,7 +147,8 @@ class MetricsMulticlass(Metrics):
         self.cms_one_class = pd.DataFrame(index=self.threshold_range, columns=self.class_labels, dtype=object)
         self.cms_one_class = self.cms_one_class.applymap(lambda x: np.zeros([2, 2]))
 
-        for index_sample, sample in enumerate(tqdm(self.dataset, desc='Metrics processing time', leave=True)):
+        for index_sample, sample in enumerate(tqdm(self.iterate_dataset(), total=len(self.dataset),
+                                                   desc='Metrics processing time', leave=True)):
             mask, pred, name_file = sample['mask'], sample['pred'], sample['name_file']
 
             if not self.in_prob_range:
@@ -1,6 +1,6 @@
 import numpy as np
 import rasterio
-from rasterio import features
+from rasterio import features, windows
 from odeon import LOGGER
 
 IMAGE_TYPE = {
@@ -94,6 +94,42 @@ def get_bounds(x, y, width, height, resolution_x, resolution_y):
     return left, bottom, right, top
 
 
+def window_from_bounds(left, bottom, right, top, transform):
+    """
+    get the window of bounds in a raster directly from the coefficients of its
+    affine transform, for a north up raster (west to east columns) it avoids the inverse transform
+    computed by rasterio.windows.from_bounds for each call
+
+    Parameters
+    ----------
+    left : float
+     left bound in Geocoordinate
+    bottom : float
+     bottom bound in Geocoordinate
+    right : float
+     right bound in Geocoordinate
+    top : float
+     top bound in Geocoordinate
+    transform : rasterio.Affine
+     affine transform of the raster
+
+    Returns
+    -------
+    rasterio.windows.Window
+
+    """
+
+    if transform.b != 0 or transform.d != 0 or transform.a <= 0 or transform.e >= 0:
+
+        # rotated, south up or east to west raster
+        return windows.from_bounds(left, bottom, right, top, transform)
+
+    return windows.Window(col_off=(left - transform.c) / transform.a,
+                          row_off=(top - transform.f) / transform.e,
+                          width=(right - left) / transform.a,
+                          height=(bottom - top) / transform.e)
+
+
 def create_patch_from_center(out_file, msk_raster, meta, window, resampling):
     """Create mask
 
@@ -116,24 +152,14 @@ def create_patch_from_center(out_file, msk_raster, meta, window, resampling):
     with rasterio.open(msk_raster) as dst:
 
         clip = dst.read(window=window, out_shape=(meta["count"], meta["height"], meta["width"]), resampling=resampling)
-        # building the no label band
-
-        bands = clip[0:clip.shape[0]-1].astype(np.bool).astype(np.uint8).copy()
-        other_band = np.sum(bands, axis=0, dtype=np.uint8)
-        other_band = (other_band == 0).astype(np.uint8)
+        # building the no label band in place of the last band of the clip: a pixel
+        # belongs to it when no other band is set.
+        clip[-1] = np.logical_not(np.any(clip[0:clip.shape[0]-1], axis=0))
 
         with rasterio.open(out_file, 'w', **meta) as raster_out:
 
-            # raster_out.write(clip)
-            # LOGGER.info(np.array([other_band]).shape)
-            # LOGGER.info(clip[0:clip.shape[0]-1].shape)
-
-            out = dst.read(window=window,
-                           out_shape=(meta["count"], meta["height"], meta["width"]),
-                           resampling=resampling)
-            out = np.vstack((out[0:out.shape[0]-1], np.array([other_band])))
-            # LOGGER.debug(out.shape)
-            raster_out.write(out)
+            # LOGGER.debug(clip.shape)
+            raster_out.write(clip)
 
         return window
 
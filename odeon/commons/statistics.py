@@ -30,19 +30,22 @@ Statistics class to compute descriptive statistics on a dataset.
 """
 
 import os
+import multiprocessing
 from odeon import LOGGER
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from scipy.stats import entropy
+from scipy.special import xlogy
+import torch
 from torch.utils.data import DataLoader
 from tqdm import tqdm
 from cycler import cycler
 from odeon.commons.reports.report_factory import Report_Factory
 from odeon.commons.exception import OdeonError, ErrorCodes
 
-BATCH_SIZE = 1
-NUM_WORKERS = 1
+BATCH_SIZE = 8
+NUM_WORKERS = max(multiprocessing.cpu_count() // 2, 1)
+DEVICE = 'cpu'
 BIT_DEPTH = '8 bits'
 GET_SKEWNESS_KURTOSIS = False
 GET_RADIO_STATS = False
@@ -50,6 +53,76 @@ MOVING_AVERAGE = 3
 DECIMALS = 3
 
 
+def _bands_histograms(bands, bins):
+    """Compute the histograms of several bands at once, with the same bins semantics as np.histogram:
+    all bins are half-open except the last one which includes its right edge, values out of the bins
+    range are not counted.
+
+    Parameters
+    ----------
+    bands : np.array
+        Array of shape (number of bands, number of values).
+    bins : np.array
+        Monotonically increasing bin edges.
+
+    Returns
+    -------
+    np.array
+        Array of shape (number of bands, len(bins) - 1) with the count of values of each band in each bin.
+    """
+    nbr_bins = len(bins) - 1
+    idx_bins = np.searchsorted(bins, bands, side='right') - 1
+    idx_bins[bands == bins[-1]] = nbr_bins - 1
+    in_range = (idx_bins >= 0) & (idx_bins < nbr_bins)
+    # Each band gets its own range of bins to count all the bands with a single bincount.
+    idx_bins += np.arange(bands.shape[0])[:, np.newaxis] * nbr_bins
+    return np.bincount(idx_bins[in_range], minlength=bands.shape[0] * nbr_bins).reshape(bands.shape[0], nbr_bins)
+
+
+def _bands_histograms_torch(bands, bins):
+    """Torch version of _bands_histograms, computed on the device of the bands with the same bins semantics,
+    so that statistics computed on a gpu are equal to the ones computed on the cpu.
+
+    Parameters
+    ----------
+    bands : torch.Tensor
+        Tensor of shape (number of bands, number of values).
+    bins : torch.Tensor
+        Monotonically increasing bin edges, with the dtype and on the device of bands.
+
+    Returns
+    -------
+    torch.Tensor
+        Tensor of shape (number of bands, len(bins) - 1) with the count of values of each band in each bin.
+    """
+    nbr_bins = len(bins) - 1
+    idx_bins = torch.searchsorted(bins, bands, right=True) - 1
+    idx_bins[bands == bins[-1]] = nbr_bins - 1
+    in_range = (idx_bins >= 0) & (idx_bins < nbr_bins)
+    # Each band gets its own range of bins to count all the bands with a single bincount.
+    idx_bins += torch.arange(bands.shape[0], device=bands.device).unsqueeze(1) * nbr_bins
+    return torch.bincount(idx_bins[in_range], minlength=bands.shape[0] * nbr_bins).reshape(bands.shape[0], nbr_bins)
+
+
+def _patches_entropy(class_counts):
+    """Compute the entropy of the class distribution of each patch.
+
+    Parameters
+    ----------
+    class_counts : np.array
+        Array of shape (number of patches, number of classes) with the number of pixels of each class in each patch.
+
+    Returns
+    -------
+    np.array
+        Entropy of each patch, 0 for a patch without any class.
+    """
+    totals = np.sum(class_counts, axis=1, keepdims=True)
+    # Class distribution of each patch, left to 0 for a patch without any class (and so a null entropy).
+    distributions = np.divide(class_counts, totals, out=np.zeros(class_counts.shape), where=totals > 0)
+    return -np.sum(xlogy(distributions, distributions), axis=1)
+
+
 class Statistics():
 
     def __init__(self,
@@ -65,7 +138,8 @@ class Statistics():
                  batch_size=BATCH_SIZE,
                  num_workers=NUM_WORKERS,
                  get_radio_stats=GET_RADIO_STATS,
-                 plot_stacked=False):
+                 plot_stacked=False,
+                 device=DEVICE):
         """
         Init function of Statistics class.
 
@@ -95,15 +169,19 @@ class Statistics():
         bit_depth: str, optional
             The number of bits used to represent each pixel in an image, , by default "8 bits".
         batch_size: int
-            The number of image in a batch, by default 1.
+            The number of image in a batch, by default 8 (or the length of the dataset if it is smaller).
         num_workers: int, optional
-            Number of workers to use in the pytorch dataloader, by default 1.
+            Number of workers to use in the pytorch dataloader, by default half of the available cpus.
         get_radio_stats: bool, optional
             Bool to compute radiometry statistics, i.e. the distribution of each image's band according
             to each class, by default True.
         plot_stacked: bool, optional
             Parameter to know if the histograms of each band should be displayed on the same figure
             or on different figures, by default False.
+        device: str, optional
+            Device on which the statistics of the batches are computed, 'cpu' or a cuda device
+            like 'cuda:0', by default 'cpu'. Radiometry statistics are always computed on the cpu,
+            sample by sample.
         """
         # Input arguments
         self.dataset = dataset
@@ -162,16 +240,20 @@ class Statistics():
         self.get_skewness_kurtosis = get_skewness_kurtosis
 
         # To compute the stats for the images bands.
-        self.min = [float('inf')] * self.nbr_bands
-        self.max = [-float('inf')] * self.nbr_bands
-        self._sum = self._sumSq = self.means = self.std = np.zeros(self.nbr_bands)  # Vars to compute the mean and std.
+        self.min = np.full(self.nbr_bands, np.inf)
+        self.max = np.full(self.nbr_bands, -np.inf)
+        # Vars to compute the mean and std.
+        self._sum = np.zeros(self.nbr_bands)
+        self._sumSq = np.zeros(self.nbr_bands)
+        self.means = np.zeros(self.nbr_bands)
+        self.std = np.zeros(self.nbr_bands)
         if self.get_skewness_kurtosis:
             self.skewness = np.zeros(self.nbr_bands)
             self.kurtosis = np.zeros(self.nbr_bands)
 
-        self.batch_size = batch_size
+        self.batch_size = min(batch_size, len(self.dataset))
         self.num_workers = num_workers
-        assert self.batch_size <= len(self.dataset), "batch_size must be lower than the length of the dataset"
+        self.device = device
 
         if len(self.dataset) % self.batch_size == 0:
             self.nbr_batches = len(self.dataset)//self.batch_size
@@ -194,7 +276,8 @@ class Statistics():
         self.plot_stacked = plot_stacked
 
         # Dataframes creation
-        self.df_dataset, self.df_bands_stats, self.df_classes_stats, self.df_global_stats, self.bands_hists =\
+        self.df_dataset = None
+        self.class_counts, self.df_bands_stats, self.df_classes_stats, self.df_global_stats, self.bands_hists =\
             self.create_data_for_stats()
 
     def run(self):
@@ -246,161 +329,216 @@ class Statistics():
 
         Returns
         -------
-        list(pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, list)
-            Dataframes with the right dimensions and headers and the list for the histograms.
+        list(np.array, pd.DataFrame, pd.DataFrame, pd.DataFrame, np.array)
+            Array for the number of pixels of each class in each mask, dataframes with
+            the right dimensions and headers and the array for the histograms.
         """
+        # Dataframes are created with float columns so that the statistics are stored without boxing.
         # Creation of the dataframe for the global stats
         # If we are in the multiclass case, we calculate the stats also without the last class.
         if self.nbr_classes > 2:
             df_global_stats = pd.DataFrame(index=['all classes', 'without last class'],
-                                           columns=['share multilabel', 'avg nb class in patch', 'avg entropy'])
-            df_global_stats.loc['without last class', 'share multilabel'] = 0
+                                           columns=['share multilabel', 'avg nb class in patch', 'avg entropy'],
+                                           dtype=np.float64)
         else:  # If we are in a binary case
             df_global_stats = pd.DataFrame(index=['all classes'],
-                                           columns=['share multilabel', 'avg nb class in patch', 'avg entropy'])
-        df_global_stats.loc['all classes', 'share multilabel'] = 0
+                                           columns=['share multilabel', 'avg nb class in patch', 'avg entropy'],
+                                           dtype=np.float64)
 
-        df_dataset = pd.DataFrame(index=range(len(self.dataset)), columns=self.class_labels)
+        # Pixel counts per class and per mask, the dataframe df_dataset is built from it after the scan.
+        class_counts = np.zeros((len(self.dataset), self.nbr_classes), dtype=np.int64)
 
         if self.get_skewness_kurtosis:
             header_bands = ['min', 'max', 'mean', 'std', 'skewness', 'kurtosis']
         else:
             header_bands = ['min', 'max', 'mean', 'std']
 
-        df_bands_stats = pd.DataFrame(index=self.bands_labels, columns=header_bands)
+        df_bands_stats = pd.DataFrame(index=self.bands_labels, columns=header_bands, dtype=np.float64)
 
         df_classes_stats = pd.DataFrame(index=self.class_labels,
-                                        columns=['regu L1', 'regu L2', 'pixel freq', 'freq 5% pixel', 'auc'])
+                                        columns=['regu L1', 'regu L2', 'pixel freq', 'freq 5% pixel', 'auc'],
+                                        dtype=np.float64)
 
-        bands_hists = [np.zeros(len(self.bins) - 1) for _ in range(self.nbr_bands)]
+        bands_hists = np.zeros((self.nbr_bands, len(self.bins) - 1), dtype=np.int64)
 
-        return df_dataset, df_bands_stats, df_classes_stats, df_global_stats, bands_hists
+        return class_counts, df_bands_stats, df_classes_stats, df_global_stats, bands_hists
 
     def scan_dataset(self):
         """
         Iterate over the dataset in one pass, collect all statistics on images and classes
         and compute directly global statistics.
         """
-        nb_class_in_patch, list_entropy = [], []
-        if self.nbr_classes > 2:  # If nbr classes > 2, we compute stats without last class.
-            nb_class_in_patch_wlc, list_entropy_wlc = [], []
-
         # Pass over the data to collect stats, hist, sum and counts.
-        stat_dataloader = DataLoader(self.dataset, self.batch_size, shuffle=False, num_workers=self.num_workers)
+        use_cuda = self.device.startswith('cuda')
+        stat_dataloader = DataLoader(self.dataset, self.batch_size, shuffle=False, num_workers=self.num_workers,
+                                     pin_memory=use_cuda)
 
         index = 0
+        # Number of pixels labeled with several classes, with all classes and without the last class.
+        multilabel_all, multilabel_wlc = 0, 0
         for sample in tqdm(stat_dataloader, desc='First pass', leave=True):
-            for image, mask in zip(sample['image'], sample['mask']):
-                image = self.to_pixel_input_range(image.numpy().swapaxes(0, 2).swapaxes(0, 1))
-                self.zeros_pixels += np.count_nonzero(np.sum(image, axis=2) == 0)
-                mask = mask.numpy().swapaxes(0, 2).swapaxes(0, 1)
-                for idx_band in range(self.nbr_bands):
-                    vect_band = image[:, :, idx_band].flatten()
-
-                    cr_min = np.min(vect_band)
-                    if cr_min < self.min[idx_band]:
-                        self.min[idx_band] = cr_min
-
-                    cr_max = np.max(vect_band)
-                    if cr_max > self.max[idx_band]:
-                        self.max[idx_band] = cr_max
-
-                    self._sum[idx_band] += np.sum(vect_band)
-
-                    # Cumulative addition by band of the histograms of each image.
-                    current_bins_counts = np.histogram(vect_band, self.bins)[0]
-                    self.bands_hists[idx_band] = np.add(self.bands_hists[idx_band], current_bins_counts)
-
-                for idx_class, name_class in enumerate(self.class_labels):
-                    vect_class = mask[:, :, idx_class].flatten()
-                    self.df_dataset.loc[index, name_class] = np.count_nonzero(vect_class)
-                index += 1
-
-                # Information storage for statistics.
-                self.df_global_stats.loc['all classes', 'share multilabel'] += \
-                    np.count_nonzero(np.sum(mask.copy(), axis=2) > 1)
-                # Sum of each band to get the total pixels present per class in a mask.
-                vect_sum_class = np.sum(mask, axis=(0, 1))
-                nb_class_in_patch.append(np.count_nonzero(vect_sum_class))
-
-                if all(np.equal(vect_sum_class, np.zeros(self.nbr_classes))):
-                    sample_entropy = 0  # A vector of 0 passing to the entropy function returns Nans vector.
-                else:
-                    vect_normalize = vect_sum_class/self.nbr_pixels_per_patch
-                    sample_entropy = entropy(vect_normalize)
-                list_entropy.append(sample_entropy)
-
-                if self.nbr_classes > 2:
-                    self.df_global_stats.loc['without last class', 'share multilabel'] += \
-                         np.count_nonzero(np.sum(mask[:, :, :(self.nbr_classes - 1)], axis=2) > 1)
-                    nb_class_in_patch_wlc.append(np.count_nonzero(vect_sum_class[:-1]))
-
-                    if all(np.equal(vect_sum_class[:-1], np.zeros(self.nbr_classes-1))):
-                        sample_entropy_wlc = 0
-                    else:
-                        vect_normalize_wlc = vect_sum_class[:-1]/self.nbr_pixels_per_patch
-                        sample_entropy_wlc = entropy(vect_normalize_wlc)
-                    list_entropy_wlc.append(sample_entropy_wlc)
-
-                # Make histogram of image band values where a class is present in the mask.
-                if self.get_radio_stats:
-                    image, mask = image.astype(np.int64), mask.astype(np.int64)
-                    for i, class_i in enumerate(self.class_labels):
-                        for j, band_j in enumerate(self.bands_labels):
-                            img_filter = image[:, :, j][mask[:, :, i] == 1]
-                            self.df_radio.loc[class_i, band_j] += np.histogram(img_filter,
-                                                                               bins=self.bins)[0]
-
+            # The whole batch is brought back to the pixel input range at once.
+            # Images and masks are kept channels first (B, C, H, W) as they come from the dataloader.
+            if use_cuda:
+                batch_multilabel = self.scan_batch_on_device(sample['image'], sample['mask'], index)
+                images = self.to_pixel_input_range(sample['image'].numpy()) if self.get_radio_stats else None
+            else:
+                images = self.to_pixel_input_range(sample['image'].numpy())
+                batch_multilabel = self.scan_batch(images, sample['mask'].numpy(), index)
+            multilabel_all += batch_multilabel[0]
+            multilabel_wlc += batch_multilabel[1]
+            index += len(sample['mask'])
+
+            if self.get_radio_stats:
+                for image, mask in zip(images, sample['mask'].numpy()):
+                    self.add_radio_hists(image, mask)
+
+        self.df_dataset = pd.DataFrame(self.class_counts, columns=self.class_labels)
         self.means = self._sum / self.nbr_total_pixel
+        # Sample variance from the sums of values and of squared values collected during the single pass.
+        variance = (self._sumSq - self.nbr_total_pixel * np.square(self.means)) / (self.nbr_total_pixel - 1)
+        self.std = np.sqrt(np.maximum(variance, 0))
 
-        # Second pass to compute variance:
-        for sample in tqdm(stat_dataloader, desc='Second pass', leave=True):
-            for image, _ in zip(sample['image'], sample['mask']):
-                image = self.to_pixel_input_range(image.numpy().swapaxes(0, 2).swapaxes(0, 1))
-                for idx_band in range(self.nbr_bands):
-                    vect_band = image[:, :, idx_band].flatten()
-                    self._sumSq[idx_band] += np.sum(np.square(vect_band - self.means[idx_band]))
-
-        self.std = np.sqrt((self._sumSq / (self.nbr_total_pixel - 1)))
-
-        # Third pass to compute sknewness and kurtosis
+        # Second pass to compute sknewness and kurtosis
         if self.get_skewness_kurtosis:
-            for sample in tqdm(stat_dataloader, desc='Third pass', leave=True):
-                for image, _ in zip(sample['image'], sample['mask']):
-                    image = self.to_pixel_input_range(image.numpy().swapaxes(0, 2).swapaxes(0, 1))
-                    for idx_band in range(self.nbr_bands):
-                        vect_band = image[:, :, idx_band].flatten()
-                        vect_band_std = (vect_band - self.means[idx_band]) / self.std[idx_band]
-                        self.skewness[idx_band] += np.sum(np.power(vect_band_std, 3))
-                        self.kurtosis[idx_band] += np.sum(np.power(vect_band_std, 4))
-
-        self.df_global_stats.loc['all classes', 'share multilabel'] /= self.nbr_total_pixel
-        self.df_global_stats.loc['all classes', 'avg nb class in patch'] = np.mean(nb_class_in_patch)
-        self.df_global_stats.loc['all classes', 'avg entropy'] = np.nanmean(list_entropy)
+            for sample in tqdm(stat_dataloader, desc='Second pass', leave=True):
+                for image in self.to_pixel_input_range(sample['image'].numpy()):
+                    image_std = (image - self.means[:, np.newaxis, np.newaxis]) / self.std[:, np.newaxis, np.newaxis]
+                    self.skewness += np.sum(np.power(image_std, 3), axis=(1, 2))
+                    self.kurtosis += np.sum(np.power(image_std, 4), axis=(1, 2))
+
+        self.df_global_stats.loc['all classes', 'share multilabel'] = multilabel_all / self.nbr_total_pixel
+        # Number of classes and entropy of the class distribution of each patch, from the class counts.
+        self.df_global_stats.loc['all classes', 'avg nb class in patch'] = \
+            np.mean(np.count_nonzero(self.class_counts, axis=1))
+        self.df_global_stats.loc['all classes', 'avg entropy'] = np.mean(_patches_entropy(self.class_counts))
 
         if self.nbr_classes > 2:
-            self.df_global_stats.loc['without last class', 'share multilabel'] /= self.nbr_total_pixel
-            self.df_global_stats.loc['without last class', 'avg nb class in patch'] = np.mean(nb_class_in_patch_wlc)
-            self.df_global_stats.loc['without last class', 'avg entropy'] = np.nanmean(list_entropy_wlc)
+            self.df_global_stats.loc['without last class', 'share multilabel'] = multilabel_wlc / self.nbr_total_pixel
+            self.df_global_stats.loc['without last class', 'avg nb class in patch'] = \
+                np.mean(np.count_nonzero(self.class_counts[:, :-1], axis=1))
+            self.df_global_stats.loc['without last class', 'avg entropy'] = \
+                np.mean(_patches_entropy(self.class_counts[:, :-1]))
+
+    def scan_batch(self, images, masks, index):
+        """Collect the statistics of the images and masks of a batch, with reductions over the whole batch:
+        extrema, sums and histograms of the bands, class counts and multilabel pixels.
+
+        Parameters
+        ----------
+        images : np.array
+            Batch of images in the pixel input range of shape (batch size, number of bands, height, width).
+        masks : np.array
+            Batch of masks of shape (batch size, number of classes, height, width).
+        index : int
+            Index in the dataset of the first sample of the batch.
+
+        Returns
+        -------
+        Tuple(int, int)
+            Number of pixels labeled with several classes, with all classes and without the last class.
+        """
+        self.zeros_pixels += np.count_nonzero(np.sum(images, axis=1) == 0)
+        # Statistics of all the bands at once.
+        np.minimum(self.min, np.min(images, axis=(0, 2, 3)), out=self.min)
+        np.maximum(self.max, np.max(images, axis=(0, 2, 3)), out=self.max)
+        # Sums accumulated in float64, the variance computed from them is subject to cancellation.
+        self._sum += np.sum(images, axis=(0, 2, 3), dtype=np.float64)
+        self._sumSq += np.einsum('ijkl,ijkl->j', images, images, dtype=np.float64)
+
+        # Cumulative addition by band of the histograms of the images, one row per band.
+        self.bands_hists += _bands_histograms(images.transpose(1, 0, 2, 3).reshape(self.nbr_bands, -1), self.bins)
+
+        # Sum of each band to get the total pixels present per class in a mask (masks are binary),
+        # the global stats on classes are computed from these counts after the scan.
+        self.class_counts[index:index + len(masks)] = np.sum(masks, axis=(2, 3))
+
+        # Number of labels of each pixel, the count without the last class is reused for all classes.
+        nb_labels = np.sum(masks[:, :-1], axis=1)
+        multilabel_wlc = np.count_nonzero(nb_labels > 1) if self.nbr_classes > 2 else 0
+        nb_labels += masks[:, -1]
+        multilabel_all = np.count_nonzero(nb_labels > 1)
+        return multilabel_all, multilabel_wlc
+
+    def scan_batch_on_device(self, images, masks, index):
+        """Collect the statistics of the images and masks of a batch with the computations done on the device
+        of the instance: extrema, sums and histograms of the bands, class counts and multilabel pixels.
+
+        Parameters
+        ----------
+        images : torch.Tensor
+            Batch of normalized images of shape (batch size, number of bands, height, width).
+        masks : torch.Tensor
+            Batch of masks of shape (batch size, number of classes, height, width).
+        index : int
+            Index in the dataset of the first sample of the batch.
+
+        Returns
+        -------
+        Tuple(int, int)
+            Number of pixels labeled with several classes, with all classes and without the last class.
+        """
+        images = self.to_pixel_input_range(images.to(self.device, non_blocking=True))
+        masks = masks.to(self.device, non_blocking=True)
+        self.zeros_pixels += int(torch.sum(torch.sum(images, dim=1) == 0))
+
+        # Values of all the images of the batch, one row per band.
+        bands = images.transpose(0, 1).reshape(self.nbr_bands, -1)
+        np.minimum(self.min, torch.min(bands, dim=1)[0].cpu().numpy(), out=self.min)
+        np.maximum(self.max, torch.max(bands, dim=1)[0].cpu().numpy(), out=self.max)
+        bands = bands.double()
+        self._sum += torch.sum(bands, dim=1).cpu().numpy()
+        self._sumSq += torch.sum(bands * bands, dim=1).cpu().numpy()
+
+        if hasattr(torch, 'searchsorted'):
+            bins = torch.as_tensor(self.bins, dtype=torch.float64, device=bands.device)
+            self.bands_hists += _bands_histograms_torch(bands, bins).cpu().numpy()
+        else:
+            # torch < 1.6 has no searchsorted, the histograms are computed on the cpu.
+            self.bands_hists += _bands_histograms(bands.cpu().numpy(), self.bins)
+
+        self.class_counts[index:index + len(masks)] = torch.sum(masks, dim=(2, 3)).cpu().numpy()
+
+        nb_labels = torch.sum(masks[:, :-1], dim=1)
+        multilabel_wlc = int(torch.sum(nb_labels > 1)) if self.nbr_classes > 2 else 0
+        nb_labels += masks[:, -1]
+        multilabel_all = int(torch.sum(nb_labels > 1))
+        return multilabel_all, multilabel_wlc
+
+    def add_radio_hists(self, image, mask):
+        """Add to the radiometry statistics the histograms of the image bands values where each class
+        is present in the mask.
+
+        Parameters
+        ----------
+        image : np.array
+            Image of shape (number of bands, height, width) in the pixel input range.
+        mask : np.array
+            Mask of shape (number of classes, height, width).
+        """
+        image, mask = image.astype(np.int64), mask.astype(np.int64)
+        for i, class_i in enumerate(self.class_labels):
+            radio_hists = _bands_histograms(image[:, mask[i] == 1], self.bins)
+            for j, band_j in enumerate(self.bands_labels):
+                self.df_radio.loc[class_i, band_j] += radio_hists[j]
 
     def compute_stats(self):
         """
         Compute statistics on bands and classes from the data collected during the stage scan_dataset.
         """
-        # Statistics on image bands
-        for i, name_band in enumerate(self.bands_labels):
-            self.df_bands_stats.loc[name_band, 'min'] = self.min[i]
-            self.df_bands_stats.loc[name_band, 'max'] = self.max[i]
-            self.df_bands_stats.loc[name_band, 'mean'] = self.means[i]
-            self.df_bands_stats.loc[name_band, 'std'] = self.std[i]
-            if self.get_skewness_kurtosis:
-                self.df_bands_stats.loc[name_band, 'skewness'] = self.skewness[i] / self.nbr_total_pixel
-                self.df_bands_stats.loc[name_band, 'kurtosis'] = self.kurtosis[i] / self.nbr_total_pixel
+        # Statistics on image bands, one column per statistic with one row per band.
+        self.df_bands_stats['min'] = self.min
+        self.df_bands_stats['max'] = self.max
+        self.df_bands_stats['mean'] = self.means
+        self.df_bands_stats['std'] = self.std
+        if self.get_skewness_kurtosis:
+            self.df_bands_stats['skewness'] = self.skewness / self.nbr_total_pixel
+            self.df_bands_stats['kurtosis'] = self.kurtosis / self.nbr_total_pixel
 
         self.zeros_pixels /= self.nbr_total_pixel
 
         # Divide the histogram binscounts by the number of images in the dataset. Division element wise.
-        self.bands_hists = [(band_hist/len(self.dataset)).astype(int) for band_hist in self.bands_hists]
+        self.bands_hists //= len(self.dataset)
 
         # Statistics on classes in masks
         for col in self.df_dataset.columns:
@@ -421,10 +559,15 @@ class Statistics():
                 (self.df_dataset[col][self.df_dataset[col] > 0.05 * self.nbr_pixels_per_patch].count())\
                 / len(self.dataset)
 
-            # Area under the Lorenz curve of the pixel distribution by class
-            x = self.df_dataset[col]
-            self.df_classes_stats.loc[col, 'auc'] = \
-                2 * np.sum(np.cumsum(np.sort(x))/np.sum(x))/len(self.dataset) if np.sum(x != 0) else 0
+        # Area under the Lorenz curve of the pixel distribution by class, for all classes at once
+        # (set to zero for a class absent from all the masks).
+        sorted_counts = np.sort(self.class_counts, axis=0)
+        class_totals = np.sum(sorted_counts, axis=0)
+        present = class_totals > 0
+        aucs = np.zeros(self.nbr_classes)
+        aucs[present] = 2 * np.sum(np.cumsum(sorted_counts[:, present], axis=0), axis=0) \
+            / (class_totals[present] * len(self.dataset))
+        self.df_classes_stats['auc'] = aucs
 
     def to_pixel_input_range(self, value):
         """Pixels of image in the input dataset are normalize to the range 0 to 1.
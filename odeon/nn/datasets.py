@@ -1,10 +1,9 @@
 import os
 from torch.utils.data import Dataset
-from skimage.util import img_as_float
 import rasterio
 # from rasterio.plot import reshape_as_raster
 import numpy as np
-from odeon.commons.image import raster_to_ndarray, CollectionDatasetReader
+from odeon.commons.image import raster_to_ndarray, normalize_to_float32, CollectionDatasetReader, WINDOW_READ_ENV
 from odeon.nn.transforms import ToDoubleTensor, ToPatchTensor, ToWindowTensor
 from odeon import LOGGER
 from odeon.commons.rasterio import affine_to_ndarray
@@ -25,6 +24,13 @@ class MetricsDataset(Dataset):
                  height=None):
         self.mask_files = mask_files
         self.pred_files = pred_files
+        # Masks and predictions are paired by names, checked once for the whole dataset.
+        for mask_file, pred_file in zip(self.mask_files, self.pred_files):
+            if not os.path.basename(mask_file) == os.path.basename(pred_file):
+                LOGGER.error("ERROR: %s is not present in masks files and in prediction files",
+                             os.path.basename(mask_file))
+                raise OdeonError(ErrorCodes.INVALID_DATASET_PATH,
+                                 "Masks and predictions files do not match.")
         self.nbr_class = nbr_class
         self.width = width
         self.height = height
@@ -50,31 +56,32 @@ class MetricsDataset(Dataset):
         select_bands : list of int
             List containing the indices of the bands to extract.
         """
-        bands_selected = [array[:, :, i] for i in select_bands]
-        bands_unselected = [array[:, :, i] for i in list(set(np.arange(array.shape[-1])) - set(select_bands))]
-        bands_selected = np.stack(bands_selected, axis=-1)
-        if bands_unselected:
-            bands_unselected = np.stack(bands_unselected, axis=-1)
-            bands_unselected = np.amax(bands_unselected, axis=-1).reshape(array.shape[0], array.shape[1], 1)
-            bands_selected = np.concatenate([bands_selected, bands_unselected], axis=-1)
+        unselected_bands = sorted(set(range(array.shape[-1])) - set(select_bands))
+        nbr_bands = len(select_bands) + 1 if unselected_bands else len(select_bands)
+        # The output is allocated once and filled band slice by band slice.
+        bands_selected = np.empty((array.shape[0], array.shape[1], nbr_bands), dtype=array.dtype)
+        bands_selected[:, :, :len(select_bands)] = array[:, :, select_bands]
+        if unselected_bands:
+            np.amax(array[:, :, unselected_bands], axis=-1, out=bands_selected[:, :, -1])
         return bands_selected
 
-    def read_raster(self, path_raster, bands=None):
+    def read_raster(self, path_raster, bands=None, dtype=np.float32):
         with rasterio.open(path_raster) as raster:
-            img = raster.read().swapaxes(0, 2).swapaxes(0, 1).astype(np.float32)
+            if self.type_classifier == 'multiclass':
+                # GDAL converts the pixels to dtype during the read, the image layout is a view on the bands.
+                img = raster.read(out_dtype=dtype).transpose((1, 2, 0))
+                return img if bands is None else self.select_bands(img, bands)
+            # In the binary case only the bands of interest are read (rasterio band indexes start to 1).
             if bands is None:
-                return img if self.type_classifier == 'multiclass' else img[:, :, 0]
+                return raster.read(1, out_dtype=dtype)
             else:
-                return self.select_bands(img, bands) if self.type_classifier == 'multiclass' else img[:, :, bands]
+                return raster.read([band + 1 for band in bands], out_dtype=dtype).transpose((1, 2, 0))
 
     def __getitem__(self, index):
         mask_file, pred_file = self.mask_files[index], self.pred_files[index]
-        msk = self.read_raster(mask_file, self.mask_bands)
+        # Masks are binary, they are kept in uint8 while predictions can be soft.
+        msk = self.read_raster(mask_file, self.mask_bands, dtype=np.uint8)
         pred = self.read_raster(pred_file, self.pred_bands)
-        if not os.path.basename(mask_file) == os.path.basename(pred_file):
-            LOGGER.error("ERROR: %s is not present in masks files and in prediction files", os.path.basename(msk))
-            raise OdeonError(ErrorCodes.INVALID_DATASET_PATH,
-                             "The input parameter type classifier is incorrect.")
         sample = {"mask": msk, "pred": pred, "name_file": mask_file}
         return sample
 
@@ -93,7 +100,7 @@ class PatchDataset(Dataset):
         transform function can be one of :class:`Rotation90`, :class:`Radiometry` or :class:`Compose`.
         [albumentation](https://albumentations.readthedocs.io/en/latest/index.html) functions can be used.
         When using :class:`Compose` :class:`ToDoubleTensor` must be added at the end of the transforms list.
-        by default None
+        by default None, in which case samples are only converted with :class:`ToDoubleTensor`
     width : number, optional
         sample width, if None native width is used, by default None
     height : number, optional
@@ -114,14 +121,27 @@ class PatchDataset(Dataset):
         self.mask_bands = mask_bands
         self.width = width
         self.height = height
-        self.transform_function = transform
-        pass
+        self.transform_function = transform if transform is not None else ToDoubleTensor()
+        self.cache_path = None
+        self.cache = None
 
     def __len__(self):
 
         return len(self.image_files)
 
-    def __getitem__(self, index):
+    def read_patch(self, index):
+        """Read an image and its mask from their files, without normalization.
+
+        Parameters
+        ----------
+        index : int
+            index of the sample
+
+        Returns
+        -------
+        Tuple of numpy NDArray
+            image and mask in (height, width, bands) shape
+        """
 
         # load image file
         image_file = self.image_files[index]
@@ -133,9 +153,6 @@ class PatchDataset(Dataset):
                                     band_indices=self.image_bands
                                     )
 
-        # pixels are normalized to [0, 1]
-        img = img_as_float(img)
-
         # load mask file
         mask_file = self.mask_files[index]
         msk, _ = raster_to_ndarray(
@@ -146,11 +163,67 @@ class PatchDataset(Dataset):
                                     band_indices=self.mask_bands
                                     )
 
+        return img, msk
+
+    def build_cache(self, cache_path):
+        """Decode all the images and masks once and store them in memory-mapped npy files
+        ("images.npy" and "masks.npy" in cache_path). Samples are then read from these files
+        instead of decoding the patches again at each pass over the dataset.
+        All the patches must have the same shape.
+
+        Parameters
+        ----------
+        cache_path : str
+            folder where the cache files are written
+
+        Raises
+        ------
+        OdeonError
+            the patches do not have the same shape
+        """
+        create_folder(cache_path)
+        images, masks = None, None
+
+        for index in range(len(self)):
+            img, msk = self.read_patch(index)
+
+            if images is None:
+                images = np.lib.format.open_memmap(os.path.join(cache_path, "images.npy"), mode="w+",
+                                                   dtype=img.dtype, shape=(len(self),) + img.shape)
+                masks = np.lib.format.open_memmap(os.path.join(cache_path, "masks.npy"), mode="w+",
+                                                  dtype=msk.dtype, shape=(len(self),) + msk.shape)
+
+            if img.shape != images.shape[1:] or msk.shape != masks.shape[1:]:
+                raise OdeonError(ErrorCodes.ERR_IO,
+                                 f"patches of different shapes can not be cached, check {self.image_files[index]}")
+            images[index] = img
+            masks[index] = msk
+
+        if images is not None:
+            images.flush()
+            masks.flush()
+
+        # the files are opened lazily, in each DataLoader worker
+        self.cache_path = cache_path
+        self.cache = None
+
+    def __getitem__(self, index):
+
+        if self.cache_path is not None:
+            if self.cache is None:
+                self.cache = (np.load(os.path.join(self.cache_path, "images.npy"), mmap_mode="r"),
+                              np.load(os.path.join(self.cache_path, "masks.npy"), mmap_mode="r"))
+            # copies out of the read-only mappings, transforms can then modify the samples
+            img, msk = np.array(self.cache[0][index]), np.array(self.cache[1][index])
+        else:
+            img, msk = self.read_patch(index)
+
+        # pixels are normalized to [0, 1]
+        img = normalize_to_float32(img)
+
         sample = {"image": img, "mask": msk}
 
         # apply transforms
-        if self.transform_function is None:
-            self.transform_function = ToDoubleTensor()
         sample = self.transform_function(**sample)
 
         return sample
@@ -193,7 +266,7 @@ class PatchDetectionDataset(Dataset):
                                        )
 
         # pixels are normalized to [0, 1]
-        img = img_as_float(img)
+        img = normalize_to_float32(img)
         to_tensor = ToPatchTensor()
         affine = meta["transform"]
         LOGGER.debug(affine)
@@ -237,6 +310,12 @@ class ZoneDetectionDataset(PatchDetectionDataset):
 
     def __enter__(self):
 
+        # the GDAL configuration applies as long as the connections are open
+        self.env = rasterio.Env(**WINDOW_READ_ENV)
+        self.env.__enter__()
+        # read buffers of the layers, valid as long as the connections below are open
+        self.read_buffers = {}
+
         for key in self.dict_of_raster.keys():
 
             if self.gdal_options is None:
@@ -254,6 +333,8 @@ class ZoneDetectionDataset(PatchDetectionDataset):
 
             self.dict_of_raster[key]["connection"].close()
 
+        self.env.__exit__(exc_type, exc_val, exc_tb)
+
     def __len__(self):
 
         return len(self.job)
@@ -270,7 +351,8 @@ class ZoneDetectionDataset(PatchDetectionDataset):
                                                                         self.width,
                                                                         self.height,
                                                                         self.resolution,
-                                                                        self.dem)
+                                                                        self.dem,
+                                                                        buffers=self.read_buffers)
 
             to_tensor = ToWindowTensor()
             # affine = meta["transform"]
@@ -17,7 +17,7 @@ from odeon.nn.models import load_model
 from odeon.commons.exception import OdeonError, ErrorCodes
 from odeon import LOGGER
 from odeon.commons.rasterio import ndarray_to_affine, RIODatasetCollection
-from odeon.commons.image import TypeConverter, substract_margin
+from odeon.commons.image import TypeConverter, make_margin_cropper
 from odeon.commons.shape import create_polygon_from_bounds
 from odeon.commons.folder_manager import create_folder
 NB_PROCESSOR = multiprocessing.cpu_count()
@@ -219,7 +219,8 @@ class PatchDetector(BaseDetector):
 
         if self.output_type == "bit":
 
-            self.gdal_options["bit"] = 1
+            # 1 bit per pixel in the output GeoTiff
+            self.gdal_options["nbits"] = 1
 
     def configure(self):
 
@@ -336,6 +337,7 @@ class ZoneDetector(PatchDetector):
         self.meta_output = None
         self.out_dalle_size = out_dalle_size
         self.rio_ds_collection = None
+        self.margin_cropper = None
         LOGGER.debug(out_dalle_size)
 
     def configure(self):
@@ -358,6 +360,10 @@ class ZoneDetector(PatchDetector):
             self.meta_output["height"] = math.ceil(self.out_dalle_size / self.resolution[1])
             self.meta_output["width"] = math.ceil(self.out_dalle_size / self.resolution[0])
 
+        # all the predictions have the same shape, the margin slices are computed once
+        zone_size = self.img_size_pixel * self.tile_factor
+        self.margin_cropper = make_margin_cropper((zone_size, zone_size), self.margin_zone, self.margin_zone)
+
         self.num_worker = 0 if self.num_worker is None else self.num_worker
         self.num_thread = NB_PROCESSOR if self.num_thread is None else self.num_thread
         torch.set_num_threads(self.num_thread)
@@ -366,9 +372,8 @@ class ZoneDetector(PatchDetector):
 
         for prediction, index in zip(predictions, indices):
 
-            prediction = prediction.transpose((1, 2, 0)).copy()
             # LOGGER.info(prediction.shape)
-            prediction = substract_margin(prediction, self.margin_zone, self.margin_zone)
+            prediction = self.margin_cropper(prediction.transpose((1, 2, 0)))
             prediction = reshape_as_raster(prediction)
             converter = TypeConverter()
             prediction = converter.from_type("float32").to_type(self.output_type).convert(prediction,
@@ -84,11 +84,12 @@ class ToDoubleTensor(object):
         # swap color axis because
         # numpy image: H x W x C
         # torch image: C X H X W
-        image = image.transpose((2, 0, 1)).copy()
-        mask = mask.transpose((2, 0, 1)).copy()
+        # the copy and the cast to float32 are done in a single pass
+        image = np.ascontiguousarray(image.transpose((2, 0, 1)), dtype=np.float32)
+        mask = np.ascontiguousarray(mask.transpose((2, 0, 1)), dtype=np.float32)
         return {
-            'image': torch.as_tensor(image, dtype=torch.float),
-            'mask': torch.as_tensor(mask, dtype=torch.float)
+            'image': torch.from_numpy(image),
+            'mask': torch.from_numpy(mask)
         }
 
 
@@ -100,8 +101,8 @@ class ToSingleTensor(object):
         # swap color axis because
         # numpy image: H x W x C
         # torch image: C X H X W
-        image = image.transpose((2, 0, 1)).copy()
-        return torch.from_numpy(image).float()
+        image = np.ascontiguousarray(image.transpose((2, 0, 1)), dtype=np.float32)
+        return torch.from_numpy(image)
 
 
 class ToPatchTensor(object):
@@ -113,11 +114,11 @@ class ToPatchTensor(object):
         # swap color axis because
         # numpy image: H x W x C
         # torch image: C X H X W
-        image = image.transpose((2, 0, 1)).copy()
+        image = np.ascontiguousarray(image.transpose((2, 0, 1)), dtype=np.float32)
         index = sample["index"]
         affine = sample["affine"]
         return {
-                "image": torch.from_numpy(image).float(),
+                "image": torch.from_numpy(image),
                 "index": torch.from_numpy(index).int(),
                 "affine": torch.from_numpy(affine).float()
                 }
@@ -132,11 +133,11 @@ class ToWindowTensor(object):
         # swap color axis because
         # numpy image: H x W x C
         # torch image: C X H X W
-        image = image.transpose((2, 0, 1)).copy()
+        image = np.ascontiguousarray(image.transpose((2, 0, 1)), dtype=np.float32)
         index = sample["index"]
 
         return {
-                "image": torch.from_numpy(image).float(),
+                "image": torch.from_numpy(image),
                 "index": torch.from_numpy(index).int()
                 }
 
@@ -41,7 +41,8 @@ class CLIMetrics(BaseTool):
                  get_ROC_PR_curves=DEFAULTS_VARS['get_ROC_PR_curves'],
                  get_ROC_PR_values=DEFAULTS_VARS['get_ROC_PR_values'],
                  get_calibration_curves=DEFAULTS_VARS['get_calibration_curves'],
-                 get_hists_per_metrics=DEFAULTS_VARS['get_hists_per_metrics']):
+                 get_hists_per_metrics=DEFAULTS_VARS['get_hists_per_metrics'],
+                 num_workers=DEFAULTS_VARS['num_workers']):
         """
         mask_path : str
             Path to the folder containing the masks.
@@ -94,6 +95,9 @@ class CLIMetrics(BaseTool):
         get_hists_per_metrics : bool, optional
             Boolean to know if the user wants to generate histogram for each metric.
             Histograms created using the parameter threshold, by default True.
+        num_workers : int, optional
+            Number of threads reading the masks and predictions in advance while the metrics
+            of a sample are computed, by default 1.
         """
         self.mask_path = mask_path
         self.pred_path = pred_path
@@ -125,6 +129,7 @@ class CLIMetrics(BaseTool):
         self.get_ROC_PR_values = get_ROC_PR_values
         self.get_calibration_curves = get_calibration_curves
         self.get_hists_per_metrics = get_hists_per_metrics
+        self.num_workers = num_workers
         self.mask_files, self.pred_files = self.get_files_from_input_paths()
         self.height, self.width, mask_class, pred_class = self.get_samples_shapes()
 
@@ -231,7 +236,8 @@ class CLIMetrics(BaseTool):
                                                             get_ROC_PR_curves=self.get_ROC_PR_curves,
                                                             get_ROC_PR_values=self.get_ROC_PR_values,
                                                             get_calibration_curves=self.get_calibration_curves,
-                                                            get_hists_per_metrics=self.get_hists_per_metrics)
+                                                            get_hists_per_metrics=self.get_hists_per_metrics,
+                                                            num_workers=self.num_workers)
 
     def __call__(self):
         """
@@ -341,13 +347,14 @@ class CLIMetrics(BaseTool):
                              f"File ${mask_file} does not exist.")
 
         if os.path.exists(pred_file):
+            # Only the shape of the prediction is needed, its pixels are not read.
             with rasterio.open(pred_file) as pred_raster:
-                pred = pred_raster.read().swapaxes(0, 2).swapaxes(0, 1)
+                pred_shape = (pred_raster.height, pred_raster.width, pred_raster.count)
         else:
             raise OdeonError(ErrorCodes.ERR_FILE_NOT_EXIST,
                              f"File ${pred_file} does not exist.")
 
-        if mask.shape[0:-1] != pred.shape[0:-1]:
+        if mask.shape[0:-1] != pred_shape[0:-1]:
             LOGGER.error('ERROR: check the width/height of the inputs masks and detections. \
                 Those input data should have the same width/height.')
             raise OdeonError(ErrorCodes.ERR_JSON_SCHEMA_ERROR,
@@ -356,4 +363,4 @@ class CLIMetrics(BaseTool):
         assert len(np.unique(mask.flatten())) <= mask.shape[-1], \
             "Mask must contain a maximum number of unique values equal to the number of classes"
 
-        return mask.shape[0], mask.shape[1], mask.shape[-1], pred.shape[-1]
+        return mask.shape[0], mask.shape[1], mask.shape[-1], pred_shape[-1]
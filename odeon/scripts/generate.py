@@ -7,6 +7,7 @@ main entry point to generation tool
 
 import os
 import glob
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
@@ -16,7 +17,7 @@ from rasterio.windows import transform
 from rasterio.features import rasterize, geometry_window
 from shapely.geometry import shape
 from shapely.ops import transform as shape_transform
-from odeon.commons.image import CollectionDatasetReader
+from odeon.commons.image import CollectionDatasetReader, WINDOW_READ_ENV
 from odeon.commons.rasterio import get_max_type
 from odeon import LOGGER
 from odeon.commons.dataframe import set_path_to_center, split_dataset_from_df
@@ -703,25 +704,43 @@ class Generator(BaseTool):
             None
 
             """
-            for _, center in tqdm(df.iterrows(), total=len(df)):
-
-                try:
-                    # Verification if the future output file already exists. If True, the former one will be deleted.
-                    if os.path.isfile(center["img_file"]):
-                        os.remove(center["img_file"])
-
-                    CollectionDatasetReader.stack_window_raster(center,
-                                                                dict_of_raster,
-                                                                meta_img,
-                                                                dem,
-                                                                compute_only_masks,
-                                                                raster_out,
-                                                                meta_msk)
-                except Exception as error:
+            # one thread per layer at most, each layer has its own connection.
+            # No layer is read when only the masks are computed.
+            executor = None
+            if not compute_only_masks and dict_of_raster:
+                executor = ThreadPoolExecutor(max_workers=min(len(dict_of_raster), 4))
+            # read buffers of the layers, reused from one patch to the next while the connections stay open
+            buffers = {}
 
-                    raise OdeonError(ErrorCodes.ERR_GENERATION_ERROR,
-                                     "something went wrong during generation",
-                                     stack_trace=error)
+            try:
+
+                for _, center in tqdm(df.iterrows(), total=len(df)):
+
+                    try:
+                        # Verification if the future output file already exists. If True, the former one
+                        # will be deleted.
+                        if os.path.isfile(center["img_file"]):
+                            os.remove(center["img_file"])
+
+                        CollectionDatasetReader.stack_window_raster(center,
+                                                                    dict_of_raster,
+                                                                    meta_img,
+                                                                    dem,
+                                                                    compute_only_masks,
+                                                                    raster_out,
+                                                                    meta_msk,
+                                                                    executor=executor,
+                                                                    buffers=buffers)
+                    except Exception as error:
+
+                        raise OdeonError(ErrorCodes.ERR_GENERATION_ERROR,
+                                         "something went wrong during generation",
+                                         stack_trace=error)
+
+            finally:
+
+                if executor is not None:
+                    executor.shutdown()
 
         stdout = f'''
                 ##############################################
@@ -736,43 +755,45 @@ class Generator(BaseTool):
         # Modifications on dict_of_raster from generation to match with the dict_of_raster in detection
         # in order to use the same function get_stacked_window_collection for DEM computation.
 
-        for i, source_type in enumerate(self.dict_of_raster.keys()):
-            self.dict_of_raster[source_type]['connection'] = \
-                rasterio.open(self.dict_of_raster[source_type]['path'][pointer])
-            if i == 0:
-                self.meta_msk['transform'] = self.dict_of_raster[source_type]['connection'].transform
-                self.meta_img['transform'] = self.meta_msk['transform']
-
-        for split_name, split in self.splits.items():
-            LOGGER.info(f"generating {split_name} data")
-            s = split[split["num_seq"] == pointer]
-
-            LOGGER.debug(s)
-            generate_data(s,
-                          self.meta_msk,
-                          self.meta_img,
-                          self.raster_out,
-                          self.dict_of_raster,
-                          self.dem,
-                          self.compute_only_masks)
-
-            output_split = os.path.join(self.output_path, f"{split_name}.csv")
-
-            if (self.append or pointer > 0) is True and os.path.isfile(output_split):
-                df = pd.read_csv(output_split, header=None, names=["img_file", "msk_file"])
-                df = pd.concat([df, s], ignore_index=True)
-                df = df.drop_duplicates(subset=['img_file', 'msk_file'], keep='last')
-                df[["img_file", "msk_file"]].to_csv(output_split,
-                                                    index=False,
-                                                    header=False)
+        with rasterio.Env(**WINDOW_READ_ENV):
 
-            else:
-                s[["img_file", "msk_file"]].to_csv(output_split,
-                                                   index=False,
-                                                   header=False)
-        # Close all opened rasters
-        for source_type in self.dict_of_raster.keys():
-            self.dict_of_raster[source_type]['connection'].close()
+            for i, source_type in enumerate(self.dict_of_raster.keys()):
+                self.dict_of_raster[source_type]['connection'] = \
+                    rasterio.open(self.dict_of_raster[source_type]['path'][pointer])
+                if i == 0:
+                    self.meta_msk['transform'] = self.dict_of_raster[source_type]['connection'].transform
+                    self.meta_img['transform'] = self.meta_msk['transform']
+
+            for split_name, split in self.splits.items():
+                LOGGER.info(f"generating {split_name} data")
+                s = split[split["num_seq"] == pointer]
+
+                LOGGER.debug(s)
+                generate_data(s,
+                              self.meta_msk,
+                              self.meta_img,
+                              self.raster_out,
+                              self.dict_of_raster,
+                              self.dem,
+                              self.compute_only_masks)
+
+                output_split = os.path.join(self.output_path, f"{split_name}.csv")
+
+                if (self.append or pointer > 0) is True and os.path.isfile(output_split):
+                    df = pd.read_csv(output_split, header=None, names=["img_file", "msk_file"])
+                    df = pd.concat([df, s], ignore_index=True)
+                    df = df.drop_duplicates(subset=['img_file', 'msk_file'], keep='last')
+                    df[["img_file", "msk_file"]].to_csv(output_split,
+                                                        index=False,
+                                                        header=False)
+
+                else:
+                    s[["img_file", "msk_file"]].to_csv(output_split,
+                                                       index=False,
+                                                       header=False)
+            # Close all opened rasters
+            for source_type in self.dict_of_raster.keys():
+                self.dict_of_raster[source_type]['connection'].close()
 
     def clean(self):
         """Clean temporary pre-rasterized mask
@@ -9,6 +9,7 @@ The input parameters pass to the Stats object will come from a configuration fil
 
 import os
 import csv
+import multiprocessing
 import torch
 import rasterio
 from datetime import datetime
@@ -19,11 +20,12 @@ from odeon.commons.statistics import Statistics
 from odeon.nn.transforms import Compose, Rotation90, Rotation, Radiometry, ToDoubleTensor
 from odeon.nn.datasets import PatchDataset
 
-BATCH_SIZE = 1
-NUM_WORKERS = 1
+BATCH_SIZE = 8
+NUM_WORKERS = max(multiprocessing.cpu_count() // 2, 1)
 BIT_DEPTH = '8 bits'
 GET_SKEWNESS_KURTOSIS = False
 GET_RADIO_STATS = True
+DEVICE = 'cpu'
 
 
 class Stats(BaseTool):
@@ -45,7 +47,9 @@ class Stats(BaseTool):
                  batch_size=BATCH_SIZE,
                  num_workers=NUM_WORKERS,
                  get_radio_stats=GET_RADIO_STATS,
-                 plot_stacked=False):
+                 plot_stacked=False,
+                 device=DEVICE,
+                 cache_path=None):
 
         """Init function of Stats class.
 
@@ -79,15 +83,21 @@ class Stats(BaseTool):
         bit_depth: str, optional
             The number of bits used to represent each pixel in an image, , by default "8 bits".
         batch_size: int
-            The number of image in a batch, by default 1.
+            The number of image in a batch, by default 8 (or the length of the dataset if it is smaller).
         num_workers: int, optional
-            Number of workers to use in the pytorch dataloader, by default 1.
+            Number of workers to use in the pytorch dataloader, by default half of the available cpus.
         get_radio_stats: bool, optional
             Bool to compute radiometry statistics, i.e. the distribution of each image's band according
             to each class, by default True.
         plot_stacked: bool, optional
             Parameter to know if the histograms of each band should be displayed on the same figure
             or on different figures, by default False.
+        device: str, optional
+            Device on which the statistics are computed, 'cpu' or 'cuda:X' with X the id of the gpu,
+            by default 'cpu'. Radiometry statistics (get_radio_stats) are always computed on the cpu.
+        cache_path: str, optional
+            Folder where the patches are decoded once in memory-mapped files, then read from these files
+            by each pass over the dataset. All the patches must have the same shape, by default None.
         """
         self.input_path = input_path
 
@@ -113,7 +123,7 @@ class Stats(BaseTool):
         self.nbr_bins = nbr_bins
         self.bit_depth = bit_depth
         self.get_skewness_kurtosis = get_skewness_kurtosis
-        # self.device = self.check_device(device)
+        self.device = self.check_device(device)
         self.batch_size = batch_size
         self.num_workers = num_workers
 
@@ -192,6 +202,8 @@ class Stats(BaseTool):
                                     height=min(self.img_heigth, self.msk_heigth),
                                     image_bands=self.image_bands,
                                     mask_bands=self.mask_bands)
+        if cache_path is not None:
+            self.dataset.build_cache(cache_path)
 
         self.statistics = Statistics(dataset=self.dataset,
                                      output_path=self.output_path,
@@ -205,7 +217,8 @@ class Stats(BaseTool):
                                      batch_size=self.batch_size,
                                      num_workers=self.num_workers,
                                      get_radio_stats=self.get_radio_stats,
-                                     plot_stacked=self.plot_stacked)
+                                     plot_stacked=self.plot_stacked,
+                                     device=self.device)
 
     def __call__(self):
         """
@@ -307,25 +320,30 @@ class Stats(BaseTool):
 
         Parameters
         ----------
-        proposed_device: int/list
-            Device(s) in the configuration file to use for the Stats tool.
+        proposed_device: str
+            Device in the configuration file to use for the Stats tool.
+
+        Returns
+        -------
+        str
+            The proposed device if it is available, else 'cpu'.
         """
         default_device = 'cpu'
         # check if device as the good format
         if proposed_device == 'cpu':
             pass
-        elif proposed_device.startswith('cuda:'):
-            id_device = proposed_device.split(':')[1]
+        elif proposed_device.startswith('cuda:') and proposed_device.split(':')[1].strip().isdigit():
+            id_device = int(proposed_device.split(':')[1])
             cuda_available = torch.cuda.is_available()
             devices_available = list(range(torch.cuda.device_count()))
 
             if cuda_available and id_device in devices_available:
                 # If verbosity
-                LOGGER.info(f'INFO: device used : {default_device}')
+                LOGGER.info(f'INFO: device used : {proposed_device}')
                 LOGGER.info(f"""GPU: {torch.cuda.get_device_name(id_device)}
                 Memory Usage:
-                Allocated:, {round(torch.cuda.memory_allocated(0)/1024**3,1)} GB
-                Cached:   , {round(torch.cuda.memory_reserved(0)/1024**3,1)} GB""")
+                Allocated:, {round(torch.cuda.memory_allocated(id_device)/1024**3,1)} GB
+                Cached:   , {round(torch.cuda.memory_reserved(id_device)/1024**3,1)} GB""")
                 return proposed_device
 
             else:
@@ -79,7 +79,8 @@ class Trainer(BaseTool):
                  lr=0.001,
                  data_augmentation=None,
                  device=None,
-                 reproducible=False
+                 reproducible=False,
+                 cache_path=None
                  ):
         """[summary]
 
@@ -129,6 +130,10 @@ class Trainer(BaseTool):
             device if None 'cpu' or 'cuda' if available will be used, by default None
         reproducible : bool, optional
             activate training reproducibility, by default False
+        cache_path : str, optional
+            folder where the train and validation patches are decoded once in memory-mapped files
+            before the training, they are then read from these files at each epoch. All the patches
+            must have the same shape. By default None (patches are decoded at each epoch)
         """
         self.verbosity = verbosity
         self.model_name = model_name
@@ -184,6 +189,8 @@ class Trainer(BaseTool):
                                      transform=Compose(self.transformation_functions),
                                      image_bands=image_bands,
                                      mask_bands=mask_bands)
+        if cache_path is not None:
+            train_dataset.build_cache(os.path.join(cache_path, "train"))
         self.train_dataloader = DataLoader(train_dataset,
                                            self.batch_size,
                                            shuffle=True,
@@ -194,6 +201,8 @@ class Trainer(BaseTool):
                                    transform=Compose(self.transformation_functions),
                                    image_bands=image_bands,
                                    mask_bands=mask_bands)
+        if cache_path is not None:
+            val_dataset.build_cache(os.path.join(cache_path, "val"))
         self.val_dataloader = DataLoader(val_dataset,
                                          self.batch_size,
                                          shuffle=True,
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+from odeon.nn.datasets import PatchDataset
+
+
+class TestPatchDatasetCache(object):
+
+    @pytest.fixture
+    def patch_files(self, tmp_path):
+
+        rng = np.random.RandomState(0)
+        image_files, mask_files = [], []
+
+        for index in range(3):
+
+            for name, count, files in [("image", 4, image_files), ("mask", 3, mask_files)]:
+                path = str(tmp_path / f"{name}_{index}.tif")
+                high = 256 if name == "image" else 2
+                with rasterio.open(path, "w", driver="GTiff", width=64, height=64, count=count, dtype="uint8",
+                                   crs="EPSG:2154", transform=from_origin(0, 64, 1, 1)) as dst:
+                    dst.write(rng.randint(0, high, size=(count, 64, 64)).astype(np.uint8))
+                files.append(path)
+
+        return image_files, mask_files
+
+    @pytest.mark.parametrize("dataset_optional_args", [{}, {"width": 32, "height": 32, "image_bands": [3, 1]}])
+    def test_cache(self, patch_files, tmp_path, dataset_optional_args):
+
+        image_files, mask_files = patch_files
+        dataset = PatchDataset(image_files, mask_files, **dataset_optional_args)
+        cached_dataset = PatchDataset(image_files, mask_files, **dataset_optional_args)
+        cached_dataset.build_cache(str(tmp_path / "cache"))
+
+        # samples read from the cache are the same as samples decoded from the patches
+        for index in range(len(dataset)):
+            sample, cached_sample = dataset[index], cached_dataset[index]
+            np.testing.assert_array_equal(cached_sample["image"].numpy(), sample["image"].numpy())
+            np.testing.assert_array_equal(cached_sample["mask"].numpy(), sample["mask"].numpy())
+
+        assert cached_dataset.cache is not None
@@ -0,0 +1,58 @@
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+import odeon.nn.detector
+from odeon.commons.rasterio import affine_to_ndarray
+from odeon.nn.detector import PatchDetector
+
+
+class DummyModel(object):
+
+    def eval(self):
+
+        return self
+
+
+class DummyJob(object):
+    """Minimal detection job with the cells used by PatchDetector.save."""
+
+    def __init__(self, output_files):
+
+        self.cells = [{"img_output_file": output_file} for output_file in output_files]
+
+    def __len__(self):
+
+        return len(self.cells)
+
+    def get_cell_at(self, index, column):
+
+        return self.cells[index][column]
+
+    def set_cell_at(self, index, column, value):
+
+        self.cells[index][column] = value
+
+
+class TestPatchDetector(object):
+
+    def test_save_bit(self, tmp_path, monkeypatch):
+
+        monkeypatch.setattr(odeon.nn.detector, "load_model", lambda *args: DummyModel())
+        output_file = str(tmp_path / "prediction.tif")
+        job = DummyJob([output_file])
+        detector = PatchDetector(job, str(tmp_path), "unet", "unet.pth", n_classes=3, n_channel=3,
+                                 img_size_pixel=64, output_type="bit", threshold=0.5)
+        transform = from_origin(650000, 6860000, 0.2, 0.2)
+        detector.meta = {"driver": "GTiff", "dtype": "uint8", "count": 3, "width": 64, "height": 64,
+                         "crs": "EPSG:2154", "transform": transform, "nodata": None}
+
+        predictions = np.random.RandomState(0).rand(1, 3, 64, 64).astype(np.float32)
+        detector.save(predictions, np.array([[0]]), np.array([affine_to_ndarray(transform)]))
+
+        with rasterio.open(output_file) as src:
+            # thresholded pixels stored on 1 bit
+            for band in src.indexes:
+                assert src.tags(band, ns="IMAGE_STRUCTURE")["NBITS"] == "1"
+            np.testing.assert_array_equal(src.read(), (predictions[0] > 0.5).astype(np.uint8))
+        assert job.get_cell_at(0, "job_done")
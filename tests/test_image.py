@@ -0,0 +1,144 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+from odeon.commons.image import CollectionDatasetReader, TypeConverter, raster_to_ndarray
+
+
+class TestRasterToNdarray(object):
+
+    @pytest.fixture
+    def image_file(self, tmp_path):
+
+        # a distinct value for each pixel
+        data = np.arange(512 * 512, dtype=np.uint32).reshape(512, 512)
+        data = np.stack([data, data + 1]).astype(np.float32)
+        path = str(tmp_path / "image.tif")
+        with rasterio.open(path, "w", driver="GTiff", width=512, height=512, count=2, dtype="float32",
+                           crs="EPSG:2154", transform=from_origin(650000, 6860000, 0.2, 0.2)) as dst:
+            dst.write(data)
+        return path, data
+
+    @pytest.mark.parametrize("width, height", [(100, 100), (100, 60), (512, 512)])
+    def test_center_crop(self, image_file, width, height):
+
+        path, data = image_file
+        img, meta = raster_to_ndarray(path, width, height, None)
+
+        # the window is centered on the raster and spans exactly width x height pixels
+        row_off, col_off = (512 - height) // 2, (512 - width) // 2
+        expected = data[:, row_off:row_off + height, col_off:col_off + width].transpose(1, 2, 0)
+        assert img.shape == (height, width, 2)
+        np.testing.assert_array_equal(img, expected)
+        np.testing.assert_array_equal(img[height // 2, width // 2], data[:, 256, 256])
+        assert meta["transform"].almost_equals(from_origin(650000 + col_off * 0.2, 6860000 - row_off * 0.2, 0.2, 0.2))
+
+
+class TestCollectionDatasetReader(object):
+
+    @pytest.fixture
+    def dict_of_raster(self, tmp_path):
+
+        transform = from_origin(0, 64, 1, 1)
+        counts = {"RGB": 3, "NIR": 1, "DSM": 1, "DTM": 1}
+        values = {"RGB": 30, "NIR": 40, "DSM": 60, "DTM": 20}
+        dict_of_raster = {}
+
+        for name, count in counts.items():
+
+            path = str(tmp_path / f"{name}.tif")
+            with rasterio.open(path, "w", driver="GTiff", width=64, height=64, count=count,
+                               dtype="uint8", crs="EPSG:2154", transform=transform) as dst:
+                dst.write(np.full((count, 64, 64), values[name], dtype=np.uint8))
+
+            dict_of_raster[name] = {"path": path, "bands": list(range(1, count + 1))}
+            dict_of_raster[name]["connection"] = rasterio.open(path)
+
+        yield dict_of_raster
+
+        for raster in dict_of_raster.values():
+            raster["connection"].close()
+
+    def test_stack_dtm_without_dem(self, dict_of_raster):
+
+        img = CollectionDatasetReader.get_stacked_window_collection(dict_of_raster, (0, 0, 64, 64), 64, 64,
+                                                                    [1, 1], dem=False)
+        assert img.shape == (64, 64, 6)
+        np.testing.assert_allclose(img[:, :, -1], 20 / 255, rtol=1e-6)
+
+    def test_stack_dtm_with_dem(self, dict_of_raster):
+
+        img = CollectionDatasetReader.get_stacked_window_collection(dict_of_raster, (0, 0, 64, 64), 64, 64,
+                                                                    [1, 1], dem=True)
+        assert img.shape == (64, 64, 5)
+        np.testing.assert_allclose(img[:, :, :4], np.full((64, 64, 4), [30, 30, 30, 40]) / 255, rtol=1e-6)
+        # dem band: clip((DSM - DTM) * 5, 0, 255) / 255
+        np.testing.assert_allclose(img[:, :, -1], np.clip((60 - 20) * 5, 0, 255) / 255, rtol=1e-6)
+
+    @pytest.mark.parametrize("dem", [False, True])
+    def test_stack_with_executor(self, dict_of_raster, dem):
+
+        expected = CollectionDatasetReader.get_stacked_window_collection(dict_of_raster, (0, 0, 64, 64), 64, 64,
+                                                                         [1, 1], dem=dem)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            img = CollectionDatasetReader.get_stacked_window_collection(dict_of_raster, (0, 0, 64, 64), 64, 64,
+                                                                        [1, 1], dem=dem, executor=executor)
+        np.testing.assert_array_equal(img, expected)
+
+    def test_stack_with_buffers(self, dict_of_raster):
+
+        expected = CollectionDatasetReader.get_stacked_window_collection(dict_of_raster, (0, 0, 64, 64), 64, 64,
+                                                                         [1, 1])
+        buffers = {}
+        for _ in range(2):
+            img = CollectionDatasetReader.get_stacked_window_collection(dict_of_raster, (0, 0, 64, 64), 64, 64,
+                                                                        [1, 1], buffers=buffers)
+            np.testing.assert_array_equal(img, expected)
+
+        # the buffers are kept by the caller, the dictionary of raster is left untouched
+        assert set(buffers.keys()) == set(dict_of_raster.keys())
+        for raster in dict_of_raster.values():
+            assert set(raster.keys()) == {"path", "bands", "connection"}
+
+
+class TestTypeConverter(object):
+
+    @pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+    def test_uint8_from_integer(self, dtype):
+
+        # every value of the type, up to its max
+        img = np.arange(np.iinfo(dtype).max + 1, dtype=dtype).reshape(1, 1, -1)
+
+        converted = TypeConverter().from_type("float32").to_type("uint8").convert(img)
+
+        assert converted.dtype == np.uint8
+        expected = (img.astype(np.float32) / np.iinfo(dtype).max * 255).astype(np.uint8)
+        np.testing.assert_array_equal(converted, expected)
+        assert converted[0, 0, -1] == 255
+
+    def test_uint8_from_float(self):
+
+        img = np.linspace(0, 1, 3 * 64 * 64, dtype=np.float32).reshape(3, 64, 64)
+
+        converted = TypeConverter().from_type("float32").to_type("uint8").convert(img)
+
+        assert converted.dtype == np.uint8
+        np.testing.assert_array_equal(converted, (255 * img).astype(np.uint8))
+        assert converted[0, 0, 0] == 0 and converted[-1, -1, -1] == 255
+
+    def test_bit(self):
+
+        rng = np.random.RandomState(0)
+        img = rng.rand(2, 32, 32).astype(np.float32)
+        # values on the threshold are not kept
+        img[0, 0, :4] = [0.5, 0.49, 0.51, 1]
+
+        converted = TypeConverter().from_type("float32").to_type("bit").convert(img, threshold=0.5)
+
+        assert converted.dtype == np.uint8
+        assert converted.shape == img.shape
+        np.testing.assert_array_equal(converted, (img > 0.5).astype(np.uint8))
+        np.testing.assert_array_equal(converted[0, 0, :4], [0, 0, 1, 1])
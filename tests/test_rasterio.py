@@ -0,0 +1,52 @@
+import pytest
+from rasterio import Affine, windows
+from rasterio.errors import WindowError
+
+from odeon.commons.rasterio import window_from_bounds
+
+
+class TestWindowFromBounds(object):
+
+    @pytest.mark.parametrize("transform", [
+        # north up
+        Affine(0.2, 0, 650000, 0, -0.2, 6860000),
+        # south up
+        Affine(0.2, 0, 650000, 0, 0.2, 6850000),
+        # columns from east to west
+        Affine(-0.2, 0, 650100, 0, -0.2, 6860000),
+        # rotated
+        Affine(0.2, 0, 650000, 0, -0.2, 6860000) * Affine.rotation(30),
+    ])
+    @pytest.mark.parametrize("bounds", [
+        # whole pixels
+        (650010, 6859980, 650022.8, 6859992.8),
+        # fractional pixels
+        (650010.03, 6859980.07, 650022.91, 6859992.95),
+        # extending past the raster
+        (649990, 6859990, 650002, 6860010),
+    ])
+    @pytest.mark.parametrize("oriented", [True, False])
+    def test_window_from_bounds(self, transform, bounds, oriented):
+
+        left, bottom, right, top = bounds
+        if oriented:
+            # bounds ordered along the rows and columns of the raster, as expected by rasterio
+            if transform.a < 0:
+                left, right = right, left
+            if transform.e > 0:
+                bottom, top = top, bottom
+
+        try:
+            expected = windows.from_bounds(left, bottom, right, top, transform)
+        except WindowError:
+            # the same error as rasterio for bounds inconsistent with the transform
+            with pytest.raises(WindowError):
+                window_from_bounds(left, bottom, right, top, transform)
+            return
+
+        window = window_from_bounds(left, bottom, right, top, transform)
+
+        assert window.col_off == pytest.approx(expected.col_off)
+        assert window.row_off == pytest.approx(expected.row_off)
+        assert window.width == pytest.approx(expected.width)
+        assert window.height == pytest.approx(expected.height)
@@ -0,0 +1,200 @@
+import numpy as np
+import pytest
+import torch
+from scipy.stats import entropy
+from torch.utils.data import Dataset
+
+from odeon.commons.statistics import Statistics, _bands_histograms, _patches_entropy
+
+
+class ArrayDataset(Dataset):
+    """Dataset of uint8 images and binary masks of shape (N, C, H, W), normalized like PatchDataset samples."""
+
+    def __init__(self, images, masks):
+
+        self.images = images
+        self.masks = masks
+        self.image_bands = list(range(1, images.shape[1] + 1))
+        self.mask_bands = list(range(1, masks.shape[1] + 1))
+        self.height, self.width = images.shape[2], images.shape[3]
+
+    def __len__(self):
+
+        return len(self.images)
+
+    def __getitem__(self, index):
+
+        return {"image": self.images[index].astype(np.float32) / 255,
+                "mask": self.masks[index].astype(np.float32)}
+
+
+def make_dataset(nbr_samples, nbr_bands=3, nbr_classes=3, size=16, empty_masks=False):
+
+    rng = np.random.RandomState(42)
+    images = rng.randint(0, 256, size=(nbr_samples, nbr_bands, size, size)).astype(np.uint8)
+    # a bright band with a low variance, sensitive to the precision of the variance
+    images[:, -1] = rng.randint(240, 246, size=(nbr_samples, size, size))
+    if empty_masks:
+        masks = np.zeros((nbr_samples, nbr_classes, size, size), dtype=np.uint8)
+    else:
+        masks = (rng.rand(nbr_samples, nbr_classes, size, size) < 0.4).astype(np.uint8)
+        # a class absent from all the masks
+        masks[:, 0] = 0
+    return ArrayDataset(images, masks)
+
+
+def run_statistics(dataset, output_path, **kwargs):
+
+    statistics = Statistics(dataset, str(output_path), output_type='json', batch_size=2, num_workers=0, **kwargs)
+    statistics.scan_dataset()
+    statistics.compute_stats()
+    return statistics
+
+
+def pixel_values(dataset):
+    """Values of the pixels as seen by Statistics, one row per band."""
+
+    values = dataset.images.astype(np.float32) / 255 * 255
+    return values.transpose(1, 0, 2, 3).reshape(dataset.images.shape[1], -1).astype(np.float64)
+
+
+def reference_entropy(class_counts):
+
+    return np.mean([entropy(counts) if np.any(counts) else 0 for counts in class_counts])
+
+
+def reference_auc(counts):
+
+    return 2 * np.sum(np.cumsum(np.sort(counts)) / np.sum(counts)) / len(counts) if np.sum(counts != 0) else 0
+
+
+class TestHelpers(object):
+
+    def test_bands_histograms(self):
+
+        bins = np.arange(0, 256, 3)
+        rng = np.random.RandomState(0)
+        bands = rng.uniform(-10, 265, size=(4, 1000))
+        # values on the edges of the bins
+        bands[:, :len(bins)] = bins
+        expected = np.stack([np.histogram(band, bins)[0] for band in bands])
+        np.testing.assert_array_equal(_bands_histograms(bands, bins), expected)
+
+    def test_patches_entropy(self):
+
+        class_counts = np.array([[10, 0, 5], [0, 0, 0], [1, 1, 1], [0, 7, 0]])
+        expected = [entropy(counts) if np.any(counts) else 0 for counts in class_counts]
+        np.testing.assert_allclose(_patches_entropy(class_counts), expected)
+
+
+class TestStatistics(object):
+
+    def test_bands_stats(self, tmp_path):
+
+        # enough pixels for a float32 accumulation of the sums to lose precision on the variance
+        dataset = make_dataset(10, size=64)
+        statistics = run_statistics(dataset, tmp_path, get_skewness_kurtosis=True)
+        values = pixel_values(dataset)
+
+        np.testing.assert_allclose(statistics.df_bands_stats['min'], values.min(axis=1))
+        np.testing.assert_allclose(statistics.df_bands_stats['max'], values.max(axis=1))
+        np.testing.assert_allclose(statistics.df_bands_stats['mean'], values.mean(axis=1), rtol=1e-10)
+        std = values.std(axis=1, ddof=1)
+        np.testing.assert_allclose(statistics.df_bands_stats['std'], std, rtol=1e-10)
+
+        values_std = (values - values.mean(axis=1, keepdims=True)) / std[:, np.newaxis]
+        np.testing.assert_allclose(statistics.df_bands_stats['skewness'], np.mean(values_std ** 3, axis=1),
+                                   rtol=1e-8, atol=1e-12)
+        np.testing.assert_allclose(statistics.df_bands_stats['kurtosis'], np.mean(values_std ** 4, axis=1),
+                                   rtol=1e-8)
+
+        expected_hists = np.stack([np.histogram(band, statistics.bins)[0] for band in values]) // len(dataset)
+        np.testing.assert_array_equal(statistics.bands_hists, expected_hists)
+
+    def test_classes_stats(self, tmp_path):
+
+        dataset = make_dataset(5)
+        statistics = run_statistics(dataset, tmp_path)
+        masks = dataset.masks
+        class_counts = masks.sum(axis=(2, 3))
+        nbr_total_pixel = masks.shape[0] * masks.shape[2] * masks.shape[3]
+
+        np.testing.assert_array_equal(statistics.class_counts, class_counts)
+        np.testing.assert_allclose(statistics.df_classes_stats['pixel freq'],
+                                   class_counts.sum(axis=0) / nbr_total_pixel)
+        np.testing.assert_allclose(statistics.df_classes_stats['auc'],
+                                   [reference_auc(counts) for counts in class_counts.T])
+
+        global_stats = statistics.df_global_stats
+        assert global_stats.loc['all classes', 'share multilabel'] == \
+            pytest.approx(np.count_nonzero(masks.sum(axis=1) > 1) / nbr_total_pixel)
+        assert global_stats.loc['without last class', 'share multilabel'] == \
+            pytest.approx(np.count_nonzero(masks[:, :-1].sum(axis=1) > 1) / nbr_total_pixel)
+        assert global_stats.loc['all classes', 'avg nb class in patch'] == \
+            pytest.approx(np.mean(np.count_nonzero(class_counts, axis=1)))
+        assert global_stats.loc['all classes', 'avg entropy'] == pytest.approx(reference_entropy(class_counts))
+        assert global_stats.loc['without last class', 'avg entropy'] == \
+            pytest.approx(reference_entropy(class_counts[:, :-1]))
+
+    def test_radio_stats(self, tmp_path):
+
+        dataset = make_dataset(3)
+        statistics = run_statistics(dataset, tmp_path, get_radio_stats=True)
+        values = pixel_values(dataset).astype(np.int64)
+        masks = dataset.masks.transpose(1, 0, 2, 3).reshape(dataset.masks.shape[1], -1)
+
+        for i, class_i in enumerate(statistics.class_labels):
+            for j, band_j in enumerate(statistics.bands_labels):
+                np.testing.assert_array_equal(statistics.df_radio.loc[class_i, band_j],
+                                              np.histogram(values[j][masks[i] == 1], statistics.bins)[0])
+
+    def test_empty_masks(self, tmp_path):
+
+        dataset = make_dataset(4, empty_masks=True)
+        statistics = run_statistics(dataset, tmp_path)
+
+        np.testing.assert_array_equal(statistics.class_counts, 0)
+        for class_stat in ['pixel freq', 'regu L1', 'regu L2', 'auc']:
+            np.testing.assert_array_equal(statistics.df_classes_stats[class_stat], 0)
+        for row in ['all classes', 'without last class']:
+            np.testing.assert_array_equal(statistics.df_global_stats.loc[row], 0)
+
+    def test_single_sample(self, tmp_path):
+
+        dataset = make_dataset(1)
+        statistics = run_statistics(dataset, tmp_path)
+        values = pixel_values(dataset)
+
+        assert statistics.batch_size == 1
+        np.testing.assert_allclose(statistics.df_bands_stats['mean'], values.mean(axis=1), rtol=1e-10)
+        np.testing.assert_allclose(statistics.df_bands_stats['std'], values.std(axis=1, ddof=1), rtol=1e-10)
+        np.testing.assert_array_equal(statistics.class_counts, dataset.masks.sum(axis=(2, 3)))
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="no cuda device")
+class TestStatisticsDevice(object):
+
+    @pytest.mark.parametrize("bins", [None, [0, 10, 100, 101.5, 255]])
+    def test_device_parity(self, tmp_path, bins):
+
+        dataset = make_dataset(5)
+        statistics_cpu = Statistics(dataset, str(tmp_path), output_type='json', batch_size=2, num_workers=0,
+                                    bins=bins, get_radio_stats=True)
+        statistics_cpu.scan_dataset()
+        statistics_device = Statistics(dataset, str(tmp_path), output_type='json', batch_size=2, num_workers=0,
+                                       bins=bins, get_radio_stats=True, device='cuda:0')
+        statistics_device.scan_dataset()
+
+        # raw results of the scan, before the histograms are divided by the number of samples
+        np.testing.assert_array_equal(statistics_device.min, statistics_cpu.min)
+        np.testing.assert_array_equal(statistics_device.max, statistics_cpu.max)
+        np.testing.assert_allclose(statistics_device.means, statistics_cpu.means, rtol=1e-12)
+        np.testing.assert_allclose(statistics_device.std, statistics_cpu.std, rtol=1e-10)
+        np.testing.assert_array_equal(statistics_device.bands_hists, statistics_cpu.bands_hists)
+        np.testing.assert_array_equal(statistics_device.class_counts, statistics_cpu.class_counts)
+        np.testing.assert_allclose(statistics_device.df_global_stats, statistics_cpu.df_global_stats)
+        assert statistics_device.zeros_pixels == statistics_cpu.zeros_pixels
+        for class_i in statistics_cpu.class_labels:
+            for band_j in statistics_cpu.bands_labels:
+                np.testing.assert_array_equal(statistics_device.df_radio.loc[class_i, band_j],
+                                              statistics_cpu.df_radio.loc[class_i, band_j])